@@ -1,12 +1,18 @@
 import sys
 import asyncio
+import concurrent.futures
 import threading
 import math
 import time
 import base64
+import hashlib
 import json
 import os
-import winreg
+import wave
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import deque, OrderedDict, namedtuple
+from datetime import datetime, timezone
 import numpy as np
 
 
@@ -36,9 +42,33 @@ try:
 except ImportError:
     AUDIO_AVAILABLE = False
 
+try:
+    from winsdk.windows.media.devices import MediaDevice, AudioDeviceRole
+    DEVICE_EVENTS_AVAILABLE = True
+except ImportError:
+    DEVICE_EVENTS_AVAILABLE = False
+
+try:
+    import scipy.fft as scipy_fft
+    SCIPY_FFT_AVAILABLE = True
+except ImportError:
+    SCIPY_FFT_AVAILABLE = False
+
+try:
+    import pyfftw
+    FFTW_AVAILABLE = True
+except ImportError:
+    FFTW_AVAILABLE = False
+
+try:
+    import winreg
+except ImportError:
+    winreg = None
+
 
 CONFIG_DIR = os.path.join(os.environ.get('APPDATA', ''), 'WindowsIsland')
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.json')
+ART_CACHE_DIR = os.path.join(CONFIG_DIR, 'art_cache')
 
 DEFAULT_CONFIG = {
     'language': 'en',
@@ -68,6 +98,15 @@ DEFAULT_CONFIG = {
     'idle_width': 150,
     'media_width': 200,
     'eq_sensitivity': 100,
+    'eq_fft_size': 2048,
+    'eq_hop_size': 1024,
+    'eq_window': 'hann',
+    'eq_band_scale': 'log',
+    'audio_process': False,
+    'eq_fft_backend': 'auto',
+    'seek_rate': 10,
+    'media_session_policy': 'playing',
+    'media_preferred_app': '',
     'show_mic_indicator': True
 }
 
@@ -102,88 +141,2168 @@ def save_config(config):
         return False
 
 
-class AudioAnalyzer:
+class AudioSource:
     def __init__(self):
+        self.rate = 0
+        self.channels = 1
+        self.realtime = True
+
+    def open(self):
+        raise NotImplementedError
+
+    def start(self, callback):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+    def is_stale(self):
+        return False
+
+
+class AudioDeviceProvider:
+    def create_host(self):
+        return pyaudio.PyAudio()
+
+    def default_device_id(self):
+        return None
+
+    def resolve_loopback(self, p):
+        wasapi_info = p.get_host_api_info_by_type(pyaudio.paWASAPI)
+        default_speakers = p.get_device_info_by_index(wasapi_info["defaultOutputDevice"])
+        if not default_speakers["isLoopbackDevice"]:
+            for loopback in p.get_loopback_device_info_generator():
+                if default_speakers["name"] in loopback["name"]:
+                    return loopback
+        return default_speakers
+
+
+class WasapiDeviceProvider(AudioDeviceProvider):
+    def default_device_id(self):
+        if not DEVICE_EVENTS_AVAILABLE:
+            return None
+        try:
+            return MediaDevice.get_default_audio_render_id(AudioDeviceRole.DEFAULT)
+        except Exception:
+            return None
+
+
+class WasapiLoopbackSource(AudioSource):
+    def __init__(self, block=1024, devices=None):
+        super().__init__()
+        self.block = block
+        self.devices = devices or WasapiDeviceProvider()
         self.p = None
         self.stream = None
-        self.running = False
-        self.bands = [0.0] * 12
-        self.lock = threading.Lock()
-        self.freq_ranges = [
-            (20, 80), (80, 160), (160, 300), (300, 500),
-            (500, 800), (800, 1200), (1200, 2000), (2000, 3500),
-            (3500, 6000), (6000, 10000), (10000, 14000), (14000, 20000)
-        ]
+        self.device = None
+        self.device_id = None
+        self._callback = None
 
-    def start(self):
-        if not AUDIO_AVAILABLE or self.running:
+    def open(self):
+        if self.p and self.device:
             return
-        self.running = True
-        threading.Thread(target=self._capture_loop, daemon=True).start()
+        self.device_id = self.devices.default_device_id()
+        self.p = self.devices.create_host()
+        default_speakers = self.devices.resolve_loopback(self.p)
+        self.device = default_speakers
+        self.rate = int(default_speakers["defaultSampleRate"])
+        self.channels = default_speakers["maxInputChannels"]
+
+    def start(self, callback):
+        self._callback = callback
+        if self.stream:
+            if not self.stream.is_active():
+                self.stream.start_stream()
+            return
+        self.stream = self.p.open(format=pyaudio.paFloat32, channels=self.channels, rate=self.rate, input=True, input_device_index=self.device["index"], frames_per_buffer=self.block, stream_callback=self._on_stream_data)
+
+    def _on_stream_data(self, in_data, frame_count, time_info, status):
+        if in_data is not None and self._callback:
+            self._callback(np.frombuffer(in_data, dtype=np.float32))
+        return (None, pyaudio.paContinue)
+
+    def stop(self):
+        if self.stream and self.stream.is_active():
+            self.stream.stop_stream()
+
+    def is_alive(self):
+        return self.stream is None or self.stream.is_active()
+
+    def is_stale(self):
+        current = self.devices.default_device_id()
+        return current is not None and current != self.device_id
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if self.p:
+            self.p.terminate()
+            self.p = None
+        self.device = None
+
+
+class _PacedAudioSource(AudioSource):
+    def __init__(self, block=1024, realtime=True):
+        super().__init__()
+        self.block = block
+        self.realtime = realtime
+        self._callback = None
+        self._thread = None
+        self._running = False
+
+    def _next_block(self):
+        raise NotImplementedError
+
+    def start(self, callback):
+        self._callback = callback
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
     def stop(self):
-        self.running = False
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1.0)
+        self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while self._running:
+            data = self._next_block()
+            if data is None:
+                break
+            self._callback(data)
+            if self.realtime:
+                next_time += (len(data) // self.channels) / self.rate
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -0.5:
+                    next_time = time.monotonic()
+        self._running = False
+
+
+class FileAudioSource(_PacedAudioSource):
+    def __init__(self, path, realtime=True, loop=True, block=1024, rate=48000, channels=2, dtype='float32'):
+        super().__init__(block, realtime)
+        self.path = path
+        self.loop = loop
+        self.raw_rate = rate
+        self.raw_channels = channels
+        self.raw_dtype = np.dtype(dtype)
+        self._wav = None
+        self._file = None
+        self._sample_width = 0
+
+    def open(self):
+        if self.path.lower().endswith('.wav'):
+            self._wav = wave.open(self.path, 'rb')
+            self.rate = self._wav.getframerate()
+            self.channels = self._wav.getnchannels()
+            self._sample_width = self._wav.getsampwidth()
+        else:
+            self._file = open(self.path, 'rb')
+            self.rate = self.raw_rate
+            self.channels = self.raw_channels
+
+    def _read_frames(self):
+        if self._wav:
+            return self._wav.readframes(self.block)
+        return self._file.read(self.block * self.channels * self.raw_dtype.itemsize)
+
+    def _rewind(self):
+        if self._wav:
+            self._wav.rewind()
+        else:
+            self._file.seek(0)
+
+    def _decode(self, raw):
+        if self._wav is None:
+            data = np.frombuffer(raw[:len(raw) - len(raw) % self.raw_dtype.itemsize], dtype=self.raw_dtype)
+            full_scale = float(2 ** (8 * self.raw_dtype.itemsize - 1))
+            if self.raw_dtype.kind == 'u':
+                return (data.astype(np.float32) - full_scale) / full_scale
+            if self.raw_dtype.kind == 'i':
+                return data.astype(np.float32) / full_scale
+            return data.astype(np.float32, copy=False)
+        width = self._sample_width
+        if width == 1:
+            return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        if width == 2:
+            return np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+        if width == 3:
+            b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            values = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+            values = np.where(values & 0x800000, values - 0x1000000, values)
+            return values.astype(np.float32) / 8388608.0
+        return np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+
+    def _next_block(self):
+        raw = self._read_frames()
+        if not raw:
+            if not self.loop:
+                return None
+            self._rewind()
+            raw = self._read_frames()
+            if not raw:
+                return None
+        data = self._decode(raw)
+        return data[:len(data) - len(data) % self.channels]
+
+    def close(self):
+        self.stop()
+        if self._wav:
+            self._wav.close()
+            self._wav = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class SyntheticAudioSource(_PacedAudioSource):
+    def __init__(self, kind='sine_sweep', rate=48000, channels=2, realtime=True, block=1024, amplitude=0.5, sweep_seconds=10.0, low=20.0, high=20000.0, seed=0):
+        super().__init__(block, realtime)
+        self.kind = kind
+        self.amplitude = amplitude
+        self.sweep_seconds = sweep_seconds
+        self.low = low
+        self.high = high
+        self.seed = seed
+        self.rate = rate
+        self.channels = channels
+        self._position = 0
+        self._phase = 0.0
+        self._pink = None
+
+    def open(self):
+        self._position = 0
+        self._phase = 0.0
+        if self.kind == 'pink_noise' and self._pink is None:
+            size = 1 << 18
+            rng = np.random.default_rng(self.seed)
+            spectrum = np.fft.rfft(rng.standard_normal(size))
+            scale = np.zeros(len(spectrum))
+            scale[1:] = 1.0 / np.sqrt(np.arange(1, len(spectrum)))
+            pink = np.fft.irfft(spectrum * scale, size)
+            self._pink = (pink / np.abs(pink).max() * self.amplitude).astype(np.float32)
+
+    def _next_block(self):
+        n = self.block
+        if self.kind == 'silence':
+            mono = np.zeros(n, dtype=np.float32)
+        elif self.kind == 'pink_noise':
+            idx = (self._position + np.arange(n)) % len(self._pink)
+            mono = self._pink[idx]
+        else:
+            t = (self._position + np.arange(n)) / self.rate % self.sweep_seconds
+            freqs = self.low * (self.high / self.low) ** (t / self.sweep_seconds)
+            phases = self._phase + np.cumsum(2 * np.pi * freqs / self.rate)
+            self._phase = float(phases[-1] % (2 * np.pi))
+            mono = (np.sin(phases) * self.amplitude).astype(np.float32)
+        self._position += n
+        if self.channels == 1:
+            return mono
+        return np.repeat(mono, self.channels)
+
+
+ANALYZER_STOPPED = 'stopped'
+ANALYZER_STARTING = 'starting'
+ANALYZER_RUNNING = 'running'
+ANALYZER_STOPPING = 'stopping'
+
+EQ_MAX_BARS = 24
+EQ_COMPACT_WIDTH = 58
+EQ_EXPANDED_WIDTH = 81
+EQ_TILT = [
+    (40, 0.8), (113, 1.0), (219, 1.3), (387, 1.6), (632, 2.0), (980, 2.5),
+    (1549, 3.0), (2646, 4.0), (4583, 5.0), (7746, 6.0), (11832, 8.0), (16733, 10.0)
+]
+
+class BandSnapshot:
+    __slots__ = ('bands', 'timestamp', 'seq')
+
+    def __init__(self, bands, timestamp, seq):
+        self.bands = bands
+        self.timestamp = timestamp
+        self.seq = seq
+
+
+class BandPublisher:
+    def __init__(self, count):
+        self.seq = 0
+        self._slots = None
+        self.resize(count)
+
+    def resize(self, count):
+        self._slots = (np.zeros(count, dtype=np.float32), np.zeros(count, dtype=np.float32), np.zeros(2))
+
+    def publish(self, values, timestamp):
+        slots = self._slots
+        seq = self.seq + 1
+        index = seq & 1
+        np.copyto(slots[index], values)
+        slots[2][index] = timestamp
+        self.seq = seq
+
+    def read(self, out=None, retries=3):
+        for _ in range(retries):
+            seq = self.seq
+            slots = self._slots
+            index = seq & 1
+            if out is None or len(out) != len(slots[index]):
+                out = np.empty_like(slots[index])
+            np.copyto(out, slots[index])
+            timestamp = float(slots[2][index])
+            if self.seq == seq and self._slots is slots:
+                break
+        return BandSnapshot(out, timestamp, seq)
+
+
+class SharedBandPublisher:
+    HEADER_SIZE = 32
+
+    def __init__(self, shm, capacity):
+        self.capacity = capacity
+        self._header = np.ndarray(2, dtype=np.int64, buffer=shm.buf, offset=0)
+        self._stamps = np.ndarray(2, dtype=np.float64, buffer=shm.buf, offset=16)
+        self._data = np.ndarray((2, capacity), dtype=np.float32, buffer=shm.buf, offset=self.HEADER_SIZE)
+
+    @classmethod
+    def buffer_size(cls, capacity):
+        return cls.HEADER_SIZE + 2 * capacity * 4
+
+    @property
+    def seq(self):
+        return int(self._header[0])
+
+    def resize(self, count):
+        self._header[1] = min(count, self.capacity)
+
+    def publish(self, values, timestamp):
+        seq = int(self._header[0]) + 1
+        index = seq & 1
+        count = min(len(values), self.capacity)
+        self._data[index, :count] = values[:count]
+        self._stamps[index] = timestamp
+        self._header[1] = count
+        self._header[0] = seq
+
+    def read(self, out=None, retries=3):
+        for _ in range(retries):
+            seq = int(self._header[0])
+            count = int(self._header[1])
+            index = seq & 1
+            if out is None or len(out) != count:
+                out = np.empty(count, dtype=np.float32)
+            np.copyto(out, self._data[index, :count])
+            timestamp = float(self._stamps[index])
+            if int(self._header[0]) == seq:
+                break
+        return BandSnapshot(out, timestamp, seq)
+
+    def close(self):
+        self._header = None
+        self._stamps = None
+        self._data = None
+
+
+class NumpyFFTBackend:
+    name = 'numpy'
+
+    def __init__(self, size):
+        self.size = size
+        self.output = np.fft.rfft(np.zeros(size, dtype=np.float32))
+        try:
+            np.fft.rfft(np.zeros(size, dtype=np.float32), out=self.output)
+            self._use_out = True
+        except TypeError:
+            self._use_out = False
+
+    def rfft(self, frame):
+        if self._use_out:
+            return np.fft.rfft(frame, out=self.output)
+        return np.fft.rfft(frame)
+
+
+class ScipyFFTBackend:
+    name = 'scipy'
+
+    def __init__(self, size):
+        self.size = size
+        self.workers = -1 if size >= 8192 else 1
+
+    def rfft(self, frame):
+        return scipy_fft.rfft(frame, workers=self.workers)
+
+
+_FFTW_PLANS = {}
+
+
+class FFTWBackend:
+    name = 'fftw'
+
+    def __init__(self, size):
+        self.size = size
+        plan = _FFTW_PLANS.get(size)
+        if plan is None:
+            source = pyfftw.empty_aligned(size, dtype='float32')
+            target = pyfftw.empty_aligned(size // 2 + 1, dtype='complex64')
+            plan = pyfftw.FFTW(source, target, flags=('FFTW_MEASURE',))
+            _FFTW_PLANS[size] = plan
+        self.plan = plan
+
+    def rfft(self, frame):
+        np.copyto(self.plan.input_array, frame)
+        return self.plan()
+
+
+FFT_BACKENDS = {
+    'numpy': NumpyFFTBackend,
+    'scipy': ScipyFFTBackend,
+    'fftw': FFTWBackend
+}
+
+_FFT_BACKEND_CHOICE = {}
+FFT_BENCHMARKS = {}
+
+
+def available_fft_backends():
+    names = ['numpy']
+    if SCIPY_FFT_AVAILABLE:
+        names.append('scipy')
+    if FFTW_AVAILABLE:
+        names.append('fftw')
+    return names
+
+
+def benchmark_fft_backends(size, repeats=40):
+    frame = np.random.default_rng(0).standard_normal(size).astype(np.float32)
+    results = {}
+    for name in available_fft_backends():
+        try:
+            backend = FFT_BACKENDS[name](size)
+            for _ in range(3):
+                backend.rfft(frame)
+            timings = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                backend.rfft(frame)
+                timings.append(time.perf_counter() - started)
+            results[name] = float(np.median(timings))
+        except Exception as e:
+            print(f"FFT backend {name} unavailable: {e}")
+    FFT_BENCHMARKS[size] = results
+    return results
+
+
+def resolve_fft_backend(size, preference='auto'):
+    if preference in available_fft_backends():
+        return preference
+    name = _FFT_BACKEND_CHOICE.get(size)
+    if name is None:
+        results = benchmark_fft_backends(size)
+        name = min(results, key=results.get) if results else 'numpy'
+        _FFT_BACKEND_CHOICE[size] = name
+    return name
+
+
+def create_fft_backend(size, preference='auto'):
+    name = resolve_fft_backend(size, preference)
+    try:
+        return FFT_BACKENDS[name](size)
+    except Exception:
+        return NumpyFFTBackend(size)
+
+
+WINDOW_FUNCTIONS = {
+    'rectangular': np.ones,
+    'hann': np.hanning,
+    'hamming': np.hamming,
+    'blackman': np.blackman
+}
+
+
+class AudioAnalyzer:
+    def __init__(self, fft_size=2048, hop_size=1024, window='hann', source=None, band_count=6, band_scale='log', fft_backend='auto'):
+        if source is None and AUDIO_AVAILABLE:
+            source = WasapiLoopbackSource()
+        self.source = source
+        self.state = ANALYZER_STOPPED
+        self.active = False
+        self.frames_analyzed = 0
+        self.workers_started = 0
+        self.error_count = 0
+        self.restart_count = 0
+        self.device_changes = 0
+        self.last_error = None
+        self.min_backoff = 0.5
+        self.max_backoff = 30.0
+        self.max_frame_failures = 20
+        self.device_check_interval = 2.0
+        self._stop_event = threading.Event()
+        self._state_cond = threading.Condition()
+        self._worker = None
+        self._restart_requested = False
+        self._consumers = set()
+        self._session_healthy = False
+        self.band_count = max(1, int(band_count))
+        self.band_scale = band_scale
+        self.fft_backend_preference = fft_backend
+        self.min_freq = 20.0
+        self.max_freq = 20000.0
+        self.attack_coef = 0.5
+        self.release_coef = 0.3
+        self.publisher = BandPublisher(self.band_count)
+        self._smoothed = np.zeros(self.band_count, dtype=np.float32)
+        self._capture_clock = (0.0, 0)
+        self.capture_block = 1024
+        self.fft_size = 2048
+        self.hop_size = 1024
+        self.window = 'hann'
+        self.configure(fft_size, hop_size, window)
+        self._rate = 0
+        self._channels = 1
+        self._wake = threading.Event()
+        self._inline = False
+        self._frame_format = None
+        self._capture_ring = None
+        self._written = 0
+        self._consumed = 0
+        self._mono = np.zeros(self.capture_block, dtype=np.float32)
+        self._frame = None
+        self._window = None
+        self._fft = None
+        self._magnitude = None
+        self._bank_format = None
+        self._bank = None
+        self._bank_end = 0
+        self._band_levels = None
+        self._band_delta = None
+        self._band_rising = None
+        self._band_coef = None
+
+    def configure(self, fft_size=None, hop_size=None, window=None, fft_backend=None):
+        if fft_backend is not None:
+            self.fft_backend_preference = fft_backend
+        if fft_size is not None:
+            self.fft_size = max(64, int(fft_size))
+        if hop_size is not None:
+            self.hop_size = max(1, int(hop_size))
+        if window is not None:
+            self.window = window if window in WINDOW_FUNCTIONS else 'hann'
+        self.hop_size = min(self.hop_size, self.fft_size)
+
+    @property
+    def fft_backend(self):
+        return self._fft.name if self._fft else None
+
+    def set_band_count(self, band_count, band_scale=None):
+        self.band_count = max(1, int(band_count))
+        if band_scale is not None:
+            self.band_scale = band_scale
+
+    def _build_frame_buffers(self):
+        size = self.fft_size
+        self._capture_ring = np.zeros(max(size * 4, self.capture_block * 8), dtype=np.float32)
+        self._written = 0
+        self._consumed = 0
+        self._frame = np.zeros(size, dtype=np.float32)
+        self._window = WINDOW_FUNCTIONS[self.window](size).astype(np.float32)
+        self._fft = create_fft_backend(size, self.fft_backend_preference)
+        self._magnitude = np.abs(self._fft.rfft(self._frame))
+        self._frame_format = (self._rate, size, self.window, self.fft_backend_preference)
+        self._build_filter_bank()
+
+    def _band_edges(self, low, high, bin_width):
+        count = self.band_count + 2
+        if self.band_scale == 'mel':
+            mel_low = 2595.0 * np.log10(1.0 + low / 700.0)
+            mel_high = 2595.0 * np.log10(1.0 + high / 700.0)
+            edges = 700.0 * (10 ** (np.linspace(mel_low, mel_high, count) / 2595.0) - 1.0)
+        else:
+            edges = np.geomspace(low, high, count)
+        for i in range(1, count):
+            edges[i] = max(edges[i], edges[i - 1] + bin_width)
+        return edges
+
+    def _build_filter_bank(self):
+        size = self.fft_size
+        freqs = np.fft.rfftfreq(size, 1.0 / self._rate)
+        bin_width = self._rate / float(size)
+        low = max(self.min_freq, 2 * bin_width)
+        edges = self._band_edges(low, max(low * 2, min(self.max_freq, self._rate / 2.0)), bin_width)
+        bank = np.zeros((self.band_count, len(freqs)), dtype=self._magnitude.dtype)
+        for i in range(self.band_count):
+            low, center, high = edges[i], edges[i + 1], edges[i + 2]
+            weights = np.clip(np.minimum((freqs - low) / (center - low), (high - freqs) / (high - center)), 0.0, None)
+            if weights.sum() <= 0:
+                weights[np.argmin(np.abs(freqs - center))] = 1.0
+            bank[i] = weights / weights.sum()
+        tilt_freqs, tilt_gains = zip(*EQ_TILT)
+        gains = np.interp(np.log(edges[1:-1]), np.log(tilt_freqs), tilt_gains) * 20.0 / float(self._window.sum())
+        bank *= gains[:, None]
+        used = np.flatnonzero(bank.any(axis=0))
+        self._bank_end = int(used[-1]) + 1 if len(used) else 0
+        self._bank = np.ascontiguousarray(bank[:, :self._bank_end])
+        self._band_levels = np.zeros(self.band_count, dtype=self._magnitude.dtype)
+        self._band_delta = np.zeros(self.band_count, dtype=np.float32)
+        self._band_rising = np.zeros(self.band_count, dtype=bool)
+        self._band_coef = np.zeros(self.band_count, dtype=np.float32)
+        if len(self._smoothed) != self.band_count:
+            self._smoothed = np.zeros(self.band_count, dtype=np.float32)
+            self.publisher.resize(self.band_count)
+        self._bank_format = (self._rate, size, self.band_count, self.band_scale)
+
+    def _compute_bands(self, spectrum):
+        np.dot(self._bank, spectrum[:self._bank_end], out=self._band_levels)
+        np.clip(self._band_levels, 0.0, 1.0, out=self._band_levels)
+        return self._band_levels
+
+    def _on_samples(self, data):
+        ring = self._capture_ring
+        if ring is None:
+            return
+        if self._channels > 1:
+            data = data.reshape(-1, self._channels)
+            frames = data.shape[0]
+            if frames > len(self._mono):
+                self._mono = np.zeros(frames, dtype=np.float32)
+            mono = self._mono[:frames]
+            np.mean(data, axis=1, out=mono)
+        else:
+            mono = data
+        self._capture_write(ring, mono)
+        self._capture_clock = (time.monotonic(), self._written)
+        if not self._inline:
+            self._wake.set()
+            return
+        try:
+            self._process_pending()
+        except Exception as e:
+            self.error_count += 1
+            self.last_error = repr(e)
+
+    def _capture_write(self, ring, samples):
+        size = len(ring)
+        n = len(samples)
+        if n > size:
+            self._written += n - size
+            samples = samples[-size:]
+            n = size
+        pos = self._written % size
+        first = min(n, size - pos)
+        ring[pos:pos + first] = samples[:first]
+        ring[:n - first] = samples[first:]
+        self._written += n
+
+    def _process_pending(self):
+        if self._frame_format != (self._rate, self.fft_size, self.window, self.fft_backend_preference):
+            self._build_frame_buffers()
+            return
+        if self._bank_format != (self._rate, self.fft_size, self.band_count, self.band_scale):
+            self._build_filter_bank()
+        written = self._written
+        if written - self._consumed > len(self._capture_ring) // 2:
+            self._consumed = written - self.hop_size
+        while written - self._consumed >= self.hop_size:
+            self._consumed += self.hop_size
+            if self._consumed >= self.fft_size:
+                self._analyze_frame(self._consumed)
+
+    def _analyze_frame(self, end):
+        ring = self._capture_ring
+        size = len(ring)
+        start = (end - self.fft_size) % size
+        first = min(self.fft_size, size - start)
+        self._frame[:first] = ring[start:start + first]
+        self._frame[first:] = ring[:self.fft_size - first]
+        np.multiply(self._frame, self._window, out=self._frame)
+        np.abs(self._fft.rfft(self._frame), out=self._magnitude)
+        new_bands = self._compute_bands(self._magnitude)
+        self.frames_analyzed += 1
+        np.subtract(new_bands, self._smoothed, out=self._band_delta)
+        np.greater(self._band_delta, 0.0, out=self._band_rising)
+        np.multiply(self._band_rising, self.attack_coef - self.release_coef, out=self._band_coef)
+        self._band_coef += self.release_coef
+        self._band_delta *= self._band_coef
+        self._smoothed += self._band_delta
+        captured_at, written = self._capture_clock
+        self.publisher.publish(self._smoothed, captured_at - (written - end) / float(self._rate))
+
+    @property
+    def running(self):
+        return self.state in (ANALYZER_STARTING, ANALYZER_RUNNING)
+
+    def start(self):
+        if self.source is None:
+            return
+        with self._state_cond:
+            self.active = True
+            if self.state == ANALYZER_STOPPING:
+                self._restart_requested = True
+            elif self.state == ANALYZER_STOPPED:
+                self.state = ANALYZER_STARTING
+                self._stop_event.clear()
+                self._worker = threading.Thread(target=self._capture_loop, daemon=True)
+                self.workers_started += 1
+                self._worker.start()
+        self._wake.set()
+
+    def pause(self):
+        self.active = False
+        self._wake.set()
+
+    def acquire(self, consumer):
+        with self._state_cond:
+            self._consumers.add(consumer)
+        self.start()
+
+    def release(self, consumer):
+        with self._state_cond:
+            self._consumers.discard(consumer)
+            idle = not self._consumers
+        if idle:
+            self.pause()
+
+    @property
+    def consumer_count(self):
+        return len(self._consumers)
+
+    def stop(self, timeout=2.0):
+        with self._state_cond:
+            self.active = False
+            self._restart_requested = False
+            if self.state in (ANALYZER_STARTING, ANALYZER_RUNNING):
+                self.state = ANALYZER_STOPPING
+            worker = self._worker
+            self._stop_event.set()
+        self._wake.set()
+        if worker and worker is not threading.current_thread():
+            worker.join(timeout)
+        return not (worker and worker.is_alive())
 
     def get_bands(self):
-        with self.lock:
-            return self.bands.copy()
+        return self.publisher.read().bands
+
+    def read_bands(self, out=None):
+        return self.publisher.read(out)
 
     def _capture_loop(self):
+        with self._state_cond:
+            if self.state == ANALYZER_STARTING:
+                self.state = ANALYZER_RUNNING
+            self._state_cond.notify_all()
+        while True:
+            self._supervise(self.source)
+            with self._state_cond:
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.state = ANALYZER_RUNNING
+                    self._stop_event.clear()
+                    continue
+                self.state = ANALYZER_STOPPED
+                self._worker = None
+                self._state_cond.notify_all()
+                return
+
+    def _supervise(self, source):
+        consecutive_errors = 0
+        while self.running:
+            self._session_healthy = False
+            try:
+                if self._run_session(source) == 'device_changed':
+                    self.device_changes += 1
+                    consecutive_errors = 0
+            except Exception as e:
+                self.error_count += 1
+                self.last_error = repr(e)
+                consecutive_errors = 1 if self._session_healthy else consecutive_errors + 1
+            finally:
+                try:
+                    source.close()
+                except Exception:
+                    pass
+            if not self.running:
+                break
+            self.restart_count += 1
+            if consecutive_errors:
+                self._stop_event.wait(min(self.max_backoff, self.min_backoff * 2 ** (consecutive_errors - 1)))
+
+    def _run_session(self, source):
+        source.open()
+        self._rate = source.rate
+        self._channels = source.channels
+        self._inline = not source.realtime
+        self._build_frame_buffers()
+        capturing = False
+        failures = 0
+        next_check = time.monotonic() + self.device_check_interval
+        while self.running:
+            if self.active != capturing:
+                if self.active:
+                    self._consumed = self._written
+                    source.start(self._on_samples)
+                else:
+                    source.stop()
+                capturing = self.active
+            now = time.monotonic()
+            if now >= next_check:
+                next_check = now + self.device_check_interval
+                if source.is_stale():
+                    return 'device_changed'
+                if capturing and not source.is_alive():
+                    raise RuntimeError("audio stream stopped")
+            if not self._wake.wait(0.5):
+                continue
+            self._wake.clear()
+            if not capturing or self._inline:
+                continue
+            try:
+                self._process_pending()
+                failures = 0
+                self._session_healthy = True
+            except Exception as e:
+                self.error_count += 1
+                self.last_error = repr(e)
+                failures += 1
+                if failures >= self.max_frame_failures:
+                    raise
+        return 'stopped'
+
+
+def _audio_process_main(shm_name, capacity, settings, conn):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    source = settings['source_factory']() if settings.get('source_factory') else None
+    analyzer = AudioAnalyzer(settings['fft_size'], settings['hop_size'], settings['window'], source=source, band_count=settings['band_count'], band_scale=settings['band_scale'], fft_backend=settings['fft_backend'])
+    publisher = SharedBandPublisher(shm, capacity)
+    publisher.resize(analyzer.band_count)
+    analyzer.publisher = publisher
+    reported = None
+    try:
+        while True:
+            backend = analyzer.fft_backend
+            if backend is not None and backend != reported:
+                reported = backend
+                conn.send(('backend', backend, dict(FFT_BENCHMARKS)))
+            if not conn.poll(0.5):
+                continue
+            message = conn.recv()
+            kind = message[0]
+            if kind == 'stop':
+                break
+            elif kind == 'active':
+                if message[1]:
+                    analyzer.start()
+                else:
+                    analyzer.pause()
+            elif kind == 'configure':
+                analyzer.configure(*message[1:])
+            elif kind == 'bands':
+                analyzer.set_band_count(*message[1:])
+    except (EOFError, OSError):
+        pass
+    finally:
+        analyzer.stop()
+        publisher.close()
+        analyzer.publisher = None
+        shm.close()
+
+
+class ProcessAudioAnalyzer:
+    capacity = 128
+
+    def __init__(self, fft_size=2048, hop_size=1024, window='hann', band_count=6, band_scale='log', fft_backend='auto', source_factory=None):
+        self.source_factory = source_factory
+        self.settings = {
+            'fft_size': fft_size,
+            'hop_size': hop_size,
+            'window': window,
+            'band_count': min(max(1, int(band_count)), self.capacity),
+            'band_scale': band_scale,
+            'fft_backend': fft_backend
+        }
+        self.fft_backend = None
+        self.fft_benchmarks = {}
+        self.active = False
+        self.restart_count = 0
+        self.error_count = 0
+        self.last_error = None
+        self._consumers = set()
+        self._lock = threading.Lock()
+        self._shm = None
+        self._publisher = None
+        self._process = None
+        self._conn = None
+        self._spawned_at = 0.0
+        self._supervisor = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._supervisor is not None
+
+    @property
+    def consumer_count(self):
+        return len(self._consumers)
+
+    def _send(self, message):
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.send(message)
+            except (OSError, EOFError, ValueError):
+                pass
+
+    def _spawn(self):
+        settings = dict(self.settings, source_factory=self.source_factory)
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_audio_process_main, args=(self._shm.name, self.capacity, settings, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+        with self._lock:
+            old_conn = self._conn
+            self._process = process
+            self._conn = parent_conn
+            self._spawned_at = time.monotonic()
+        if old_conn:
+            old_conn.close()
+        self._send(('active', self.active))
+
+    def start(self):
+        if not AUDIO_AVAILABLE and self.source_factory is None:
+            return
+        self.active = True
+        if self._supervisor is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=SharedBandPublisher.buffer_size(self.capacity))
+            self._publisher = SharedBandPublisher(self._shm, self.capacity)
+            self._publisher.resize(self.settings['band_count'])
+            self._stop_event.clear()
+            self._spawn()
+            self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+            self._supervisor.start()
+        else:
+            self._send(('active', True))
+
+    def pause(self):
+        self.active = False
+        self._send(('active', False))
+
+    def acquire(self, consumer):
+        self._consumers.add(consumer)
+        self.start()
+
+    def release(self, consumer):
+        self._consumers.discard(consumer)
+        if not self._consumers:
+            self.pause()
+
+    def configure(self, fft_size=None, hop_size=None, window=None, fft_backend=None):
+        for key, value in (('fft_size', fft_size), ('hop_size', hop_size), ('window', window), ('fft_backend', fft_backend)):
+            if value is not None:
+                self.settings[key] = value
+        self._send(('configure', fft_size, hop_size, window, fft_backend))
+
+    def set_band_count(self, band_count, band_scale=None):
+        self.settings['band_count'] = min(max(1, int(band_count)), self.capacity)
+        if band_scale is not None:
+            self.settings['band_scale'] = band_scale
+        self._send(('bands', self.settings['band_count'], band_scale))
+
+    def _receive(self):
+        with self._lock:
+            conn = self._conn
+            try:
+                while conn is not None and conn.poll():
+                    message = conn.recv()
+                    if message[0] == 'backend':
+                        self.fft_backend = message[1]
+                        self.fft_benchmarks = message[2]
+            except (OSError, EOFError, ValueError):
+                pass
+
+    def _supervise(self):
+        failures = 0
+        while not self._stop_event.wait(0.25):
+            self._receive()
+            process = self._process
+            if process.is_alive():
+                if failures and time.monotonic() - self._spawned_at > 10.0:
+                    failures = 0
+                continue
+            self.error_count += 1
+            self.last_error = f"analyzer process exited with code {process.exitcode}"
+            failures += 1
+            if self._stop_event.wait(min(30.0, 0.5 * 2 ** (failures - 1))):
+                break
+            self.restart_count += 1
+            self._spawn()
+
+    def stop(self, timeout=2.0):
+        self.active = False
+        supervisor = self._supervisor
+        if supervisor is None:
+            return True
+        self._stop_event.set()
+        supervisor.join(timeout)
+        self._send(('stop',))
+        process = self._process
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout)
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+            self._conn = None
+            self._process = None
+        publisher = self._publisher
+        self._publisher = None
+        publisher.close()
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        self._supervisor = None
+        return not process.is_alive()
+
+    def read_bands(self, out=None):
+        publisher = self._publisher
+        if publisher is None:
+            return BandSnapshot(np.zeros(self.settings['band_count'], dtype=np.float32), 0.0, 0)
+        return publisher.read(out)
+
+    def get_bands(self):
+        return self.read_bands().bands
+
+
+class FrameTimeStats:
+    def __init__(self, size=300):
+        self.intervals = deque(maxlen=size)
+        self._last = None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.intervals.append(now - self._last)
+        self._last = now
+
+    def summary(self):
+        if not self.intervals:
+            return {}
+        values = np.array(self.intervals) * 1000.0
+        return {
+            'mean_ms': round(float(values.mean()), 2),
+            'jitter_ms': round(float(values.std()), 2),
+            'p99_ms': round(float(np.percentile(values, 99)), 2),
+            'max_ms': round(float(values.max()), 2)
+        }
+
+
+MEDIA_POLL_INTERVAL = 5000
+OPTIMISTIC_TIMEOUT = 2.0
+MEDIA_CALL_TIMEOUT = 3.0
+MEDIA_FETCH_TIMEOUT = 5.0
+MEDIA_WATCHDOG_TIMEOUT = 10.0
+TIMEOUT_ERRORS = (asyncio.TimeoutError, concurrent.futures.TimeoutError, concurrent.futures.CancelledError)
+POSITION_SNAP_THRESHOLD = 2.0
+MediaState = namedtuple('MediaState', 'is_playing artwork title artist position duration track_key')
+EMPTY_MEDIA_STATE = MediaState(False, None, "", "", 0.0, 0.0, None)
+
+
+def _completed_future(value=None):
+    future = concurrent.futures.Future()
+    future.set_result(value)
+    return future
+
+
+def read_winrt_buffer(buffer):
+    size = buffer.length
+    try:
+        return memoryview(buffer)[:size]
+    except (TypeError, ValueError):
+        pass
+    data = bytearray(size)
+    reader = DataReader.from_buffer(buffer)
+    try:
+        reader.read_bytes(data)
+    except TypeError:
+        for i in range(size):
+            data[i] = reader.read_byte()
+    return data
+
+
+class AsyncWorker:
+    def __init__(self, name="media-worker"):
+        self.loop = asyncio.new_event_loop()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro, timeout=None):
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._pending.add(future)
+        inner = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(lambda f: inner.cancel() if f.cancelled() else None)
+        inner.add_done_callback(lambda f: self._resolve(future, f))
+        return future
+
+    def _resolve(self, future, inner):
+        with self._lock:
+            if future not in self._pending:
+                return
+            self._pending.discard(future)
         try:
-            self.p = pyaudio.PyAudio()
-            wasapi_info = self.p.get_host_api_info_by_type(pyaudio.paWASAPI)
-            default_speakers = self.p.get_device_info_by_index(wasapi_info["defaultOutputDevice"])
-            if not default_speakers["isLoopbackDevice"]:
-                for loopback in self.p.get_loopback_device_info_generator():
-                    if default_speakers["name"] in loopback["name"]:
-                        default_speakers = loopback
-                        break
-            rate = int(default_speakers["defaultSampleRate"])
-            channels = default_speakers["maxInputChannels"]
-            chunk = 1024
-            self.stream = self.p.open(format=pyaudio.paFloat32, channels=channels, rate=rate, input=True, input_device_index=default_speakers["index"], frames_per_buffer=chunk)
-            while self.running:
+            if inner.cancelled():
+                future.cancel()
+            elif inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result())
+        except concurrent.futures.InvalidStateError:
+            pass
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def abandon(self):
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for future in pending:
+            try:
+                future.set_exception(concurrent.futures.CancelledError())
+            except concurrent.futures.InvalidStateError:
+                pass
+
+    def stop(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.abandon()
+
+
+class MediaBackend:
+    def subscribe(self, on_change):
+        pass
+
+    def unsubscribe(self):
+        pass
+
+    def fetch(self, known_titles=None, want_artwork=None):
+        raise NotImplementedError
+
+    def send_command(self, command, app_id=None):
+        return self.send_commands([command], app_id)
+
+    def send_commands(self, commands, app_id=None):
+        raise NotImplementedError
+
+    def seek(self, position, app_id=None):
+        raise NotImplementedError
+
+    def source_app_id(self):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.unsubscribe()
+
+
+class WinRTMediaBackend(MediaBackend):
+    def __init__(self, worker=None):
+        self.worker = worker or AsyncWorker()
+        self.manager = None
+        self._on_change = None
+        self._lock = threading.Lock()
+        self._manager_tokens = []
+        self._session_tokens = []
+
+    async def _get_manager(self):
+        if self.manager is None:
+            self.manager = await MediaManager.request_async()
+        return self.manager
+
+    async def _current_session(self):
+        manager = await self._call(self._get_manager())
+        return manager.get_current_session()
+
+    async def _sessions(self):
+        manager = await self._call(self._get_manager())
+        current = manager.get_current_session()
+        current_id = current.source_app_user_model_id if current else None
+        sessions = list(manager.get_sessions())
+        sessions.sort(key=lambda session: session.source_app_user_model_id != current_id)
+        return sessions
+
+    async def _session_for(self, app_id):
+        manager = await self._call(self._get_manager())
+        if app_id:
+            for session in manager.get_sessions():
+                if session.source_app_user_model_id == app_id:
+                    return session
+        return manager.get_current_session()
+
+    async def _call(self, awaitable, timeout=MEDIA_CALL_TIMEOUT):
+        return await asyncio.wait_for(awaitable, timeout)
+
+    def subscribe(self, on_change):
+        self._on_change = on_change
+        return self.worker.submit(self._subscribe(), MEDIA_CALL_TIMEOUT)
+
+    async def _subscribe(self):
+        try:
+            manager = await self._get_manager()
+            self._manager_tokens = [
+                (manager.remove_current_session_changed, manager.add_current_session_changed(self._on_sessions_changed)),
+                (manager.remove_sessions_changed, manager.add_sessions_changed(self._on_sessions_changed))
+            ]
+            self._watch_sessions(manager.get_sessions())
+        except Exception as e:
+            print(f"Media events unavailable: {e}")
+
+    def _notify(self):
+        if self._on_change:
+            self._on_change()
+
+    def _on_sessions_changed(self, sender, args):
+        self._watch_sessions(sender.get_sessions())
+        self._notify()
+
+    def _on_session_event(self, sender, args):
+        self._notify()
+
+    def _watch_sessions(self, sessions):
+        with self._lock:
+            self._unwatch_sessions()
+            for session in sessions:
+                self._session_tokens.extend([
+                    (session.remove_playback_info_changed, session.add_playback_info_changed(self._on_session_event)),
+                    (session.remove_media_properties_changed, session.add_media_properties_changed(self._on_session_event)),
+                    (session.remove_timeline_properties_changed, session.add_timeline_properties_changed(self._on_session_event))
+                ])
+
+    def _unwatch_sessions(self):
+        for remove, token in self._session_tokens:
+            try:
+                remove(token)
+            except Exception:
+                pass
+        self._session_tokens = []
+
+    def unsubscribe(self):
+        self._on_change = None
+        with self._lock:
+            self._unwatch_sessions()
+        for remove, token in self._manager_tokens:
+            try:
+                remove(token)
+            except Exception:
+                pass
+        self._manager_tokens = []
+
+    def reset(self):
+        on_change = self._on_change
+        self.unsubscribe()
+        self.worker.stop()
+        self.worker = AsyncWorker()
+        self.manager = None
+        if on_change:
+            self.subscribe(on_change)
+
+    def close(self):
+        self.unsubscribe()
+        self.worker.stop()
+
+    def fetch(self, known_titles=None, want_artwork=None):
+        return self.worker.submit(self._fetch(known_titles or {}, want_artwork), MEDIA_FETCH_TIMEOUT)
+
+    async def _read_playback(self, session):
+        return session.get_playback_info().playback_status == PlaybackStatus.PLAYING
+
+    async def _read_timeline(self, session):
+        timeline = session.get_timeline_properties()
+        if not timeline:
+            return 0.0, 0.0, None
+        return timeline.position.total_seconds(), timeline.end_time.total_seconds(), timeline.last_updated_time
+
+    async def _read_thumbnail(self, thumbnail):
+        stream = await self._call(thumbnail.open_read_async())
+        size = stream.size
+        buffer = Buffer(size)
+        await self._call(stream.read_async(buffer, size, InputStreamOptions.READ_AHEAD))
+        return read_winrt_buffer(buffer)
+
+    async def _fetch(self, known_titles, want_artwork):
+        try:
+            sessions = await self._sessions()
+        except TIMEOUT_ERRORS:
+            raise
+        except:
+            return []
+        results = await asyncio.gather(*(self._fetch_session(session, known_titles, want_artwork) for session in sessions), return_exceptions=True)
+        states = []
+        for result in results:
+            if isinstance(result, TIMEOUT_ERRORS):
+                raise result
+            if isinstance(result, MediaState):
+                states.append(result)
+        return states
+
+    async def _fetch_session(self, session, known_titles, want_artwork):
+        app_id = session.source_app_user_model_id or ""
+        is_playing, timeline, media_props = await asyncio.gather(
+            self._read_playback(session),
+            self._read_timeline(session),
+            self._call(session.try_get_media_properties_async()),
+            return_exceptions=True
+        )
+        if isinstance(is_playing, BaseException):
+            raise is_playing
+        
+        position = 0.0
+        duration = 0.0
+        if not isinstance(timeline, BaseException):
+            position, duration, last_updated = timeline
+            if is_playing and last_updated is not None:
                 try:
-                    data = self.stream.read(chunk, exception_on_overflow=False)
-                    audio_data = np.frombuffer(data, dtype=np.float32)
-                    if channels > 1:
-                        audio_data = audio_data.reshape(-1, channels).mean(axis=1)
-                    fft = np.abs(np.fft.rfft(audio_data))
-                    freqs = np.fft.rfftfreq(len(audio_data), 1.0 / rate)
-                    
-                    fft = fft / len(audio_data)
-                    
-                    band_multipliers = [0.8, 1.0, 1.3, 1.6, 2.0, 2.5, 3.0, 4.0, 5.0, 6.0, 8.0, 10.0]
-                    
-                    new_bands = []
-                    for idx, (low, high) in enumerate(self.freq_ranges):
-                        mask = (freqs >= low) & (freqs < high)
-                        if mask.any():
-                            val = np.mean(fft[mask])
-                            multiplier = band_multipliers[idx] if idx < len(band_multipliers) else 1.0
-                            level = min(1.0, max(0.0, val * multiplier * 20.0))
-                        else:
-                            level = 0.0
-                        new_bands.append(level)
-                    with self.lock:
-                        for i in range(len(new_bands)):
-                            self.bands[i] = self.bands[i] * 0.7 + new_bands[i] * 0.3
+                    age = (datetime.now(timezone.utc) - last_updated).total_seconds()
+                    if 0 < age < duration:
+                        position = min(duration, position + age)
                 except:
                     pass
+        
+        thumbnail = None
+        title = ""
+        artist = ""
+        album = ""
+        if media_props and not isinstance(media_props, BaseException):
+            title = media_props.title or ""
+            artist = media_props.artist or ""
+            album = media_props.album_title or ""
+            track_key = (app_id, title, artist, album)
+            if title != known_titles.get(app_id, "") and media_props.thumbnail and (want_artwork is None or want_artwork(track_key)):
+                try:
+                    thumbnail = await self._read_thumbnail(media_props.thumbnail)
+                except:
+                    pass
+        return MediaState(is_playing, thumbnail, title, artist, position, duration, (app_id, title, artist, album))
+
+    def send_commands(self, commands, app_id=None):
+        return self.worker.submit(self._send_commands(commands, app_id), MEDIA_CALL_TIMEOUT * max(1, len(commands)))
+
+    async def _send_commands(self, commands, app_id):
+        try:
+            session = await self._session_for(app_id)
+            if session:
+                for command in commands:
+                    if command == "play_pause":
+                        await session.try_toggle_play_pause_async()
+                    elif command == "next":
+                        await session.try_skip_next_async()
+                    elif command == "prev":
+                        await session.try_skip_previous_async()
+        except:
+            pass
+
+    def seek(self, position, app_id=None):
+        return self.worker.submit(self._seek(position, app_id), MEDIA_CALL_TIMEOUT)
+
+    async def _seek(self, position, app_id):
+        try:
+            session = await self._session_for(app_id)
+            if session:
+                await session.try_change_playback_position_async(int(position * 10000000))
+        except:
+            pass
+
+    def source_app_id(self):
+        return self.worker.submit(self._source_app_id(), MEDIA_CALL_TIMEOUT)
+
+    async def _source_app_id(self):
+        try:
+            session = await self._current_session()
+            if session:
+                return session.source_app_user_model_id
         except:
             pass
+        return None
+
+
+class FakeClock:
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeMediaBackend(MediaBackend):
+    def __init__(self, clock=None):
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.current = ""
+        self.fetch_count = 0
+        self.commands = []
+        self.seeks = []
+        self._on_change = None
+
+    @property
+    def fields(self):
+        return self.session(self.current)
+
+    def session(self, app_id):
+        if app_id not in self.sessions:
+            self.sessions[app_id] = {
+                'is_playing': False,
+                'thumbnail': None,
+                'title': "",
+                'artist': "",
+                'position': 0.0,
+                'duration': 0.0,
+                'album': "",
+                'app_id': app_id,
+                'artwork_changed': False,
+                'since': self.clock() if self.clock else 0.0
+            }
+        return self.sessions[app_id]
+
+    def subscribe(self, on_change):
+        self._on_change = on_change
+        return _completed_future()
+
+    def unsubscribe(self):
+        self._on_change = None
+
+    def _notify(self):
+        if self._on_change:
+            self._on_change()
+
+    def position(self, app_id=None):
+        f = self.session(self.current if app_id is None else app_id)
+        if not self.clock or not f['is_playing']:
+            return f['position']
+        position = f['position'] + self.clock() - f['since']
+        return min(position, f['duration']) if f['duration'] > 0 else position
+
+    def update(self, app_id=None, **fields):
+        app_id = self.current if app_id is None else app_id
+        if 'position' not in fields:
+            fields['position'] = self.position(app_id)
+        f = self.session(app_id)
+        if fields.get('title', f['title']) == f['title'] and fields.get('thumbnail', f['thumbnail']) != f['thumbnail']:
+            fields['artwork_changed'] = True
+        f.update(fields)
+        if self.clock:
+            f['since'] = self.clock()
+        self._notify()
+
+    def select(self, app_id):
+        self.current = app_id
+        self.session(app_id)
+        self._notify()
+
+    def remove_session(self, app_id=None):
+        self.sessions.pop(self.current if app_id is None else app_id, None)
+        self._notify()
+
+    def fetch(self, known_titles=None, want_artwork=None):
+        self.fetch_count += 1
+        known_titles = known_titles or {}
+        states = []
+        order = sorted(self.sessions, key=lambda app_id: app_id != self.current)
+        for app_id in order:
+            f = self.sessions[app_id]
+            if not (f['title'] or f['artist'] or f['duration'] > 0):
+                continue
+            track_key = (app_id, f['title'], f['artist'], f['album'])
+            thumbnail = None
+            if f['artwork_changed'] or (f['title'] != known_titles.get(app_id, "") and (want_artwork is None or want_artwork(track_key))):
+                thumbnail = f['thumbnail']
+                f['artwork_changed'] = False
+            states.append(MediaState(f['is_playing'], thumbnail, f['title'], f['artist'], self.position(app_id), f['duration'], track_key))
+        return _completed_future(states)
+
+    def send_commands(self, commands, app_id=None):
+        self.commands.extend(commands)
+        app_id = self.current if app_id is None else app_id
+        if commands.count("play_pause") % 2:
+            self.update(app_id, is_playing=not self.session(app_id)['is_playing'])
+        return _completed_future()
+
+    def seek(self, position, app_id=None):
+        self.seeks.append(position)
+        self.update(app_id, position=position)
+        return _completed_future()
+
+    def source_app_id(self):
+        return _completed_future(self.current or None)
+
+
+class MediaScenario:
+    def __init__(self, backend, steps, clock):
+        self.backend = backend
+        self.clock = clock
+        self.start = clock()
+        self.steps = sorted(steps, key=lambda step: step.get('at', 0.0))
+        self.index = 0
+        self.app_id = None
+
+    @classmethod
+    def load(cls, path, backend, clock):
+        with open(path, 'r', encoding='utf-8') as f:
+            steps = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+        for step in steps:
+            artwork = step.get('artwork')
+            if isinstance(artwork, str):
+                with open(os.path.join(base, artwork), 'rb') as art:
+                    step['artwork'] = art.read()
+        return cls(backend, steps, clock)
+
+    @property
+    def finished(self):
+        return self.index >= len(self.steps)
+
+    @property
+    def duration(self):
+        return self.steps[-1].get('at', 0.0) if self.steps else 0.0
+
+    def advance(self, seconds):
+        self.clock.advance(seconds)
+        elapsed = self.clock() - self.start
+        while not self.finished and self.steps[self.index].get('at', 0.0) <= elapsed:
+            self.apply(self.steps[self.index])
+            self.index += 1
+
+    def run(self, step=0.016, on_step=None):
+        while not self.finished:
+            self.advance(step)
+            if on_step:
+                on_step()
+
+    def apply(self, step):
+        action = step.get('action')
+        app_id = self.app_id = step.get('app_id', self.app_id)
+        if action == 'track':
+            self.backend.update(
+                app_id,
+                title=step.get('title', ""),
+                artist=step.get('artist', ""),
+                album=step.get('album', ""),
+                duration=float(step.get('duration', 0.0)),
+                position=float(step.get('position', 0.0)),
+                thumbnail=step.get('artwork'),
+                is_playing=step.get('is_playing', True)
+            )
+        elif action == 'play':
+            self.backend.update(app_id, is_playing=True)
+        elif action == 'pause':
+            self.backend.update(app_id, is_playing=False)
+        elif action == 'seek':
+            self.backend.update(app_id, position=float(step.get('position', 0.0)))
+        elif action == 'artwork':
+            self.backend.update(app_id, thumbnail=step.get('artwork'))
+        elif action == 'select':
+            self.backend.select(app_id or "")
+        elif action == 'end_session':
+            self.backend.remove_session(app_id)
+
+
+class MediaSession:
+    def __init__(self, app_id):
+        self.app_id = app_id
+        self.state = None
+        self.artwork = None
+        self.last_active = 0.0
+        self.order = 0
+
+
+class MediaService:
+    def __init__(self, backend, on_update, artwork_cache=None, policy='playing', preferred_app="", clock=time.monotonic):
+        self.backend = backend
+        self.on_update = on_update
+        self.artwork_cache = artwork_cache
+        self.policy = policy
+        self.preferred_app = preferred_app
+        self.clock = clock
+        self.sessions = {}
+        self.selected = None
+        self.events_received = 0
+        self.fetches = 0
+        self.updates_emitted = 0
+        self.fetch_timeouts = 0
+        self.watchdog_resets = 0
+        self._last_key = None
+        self._lock = threading.Lock()
+        self._fetching = False
+        self._dirty = False
+        self._future = None
+        self._fetch_started = 0.0
+        self._publish_lock = threading.Lock()
+        self._artwork_pending = 0
+        self._recheck = {}
+        self._artwork_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='artwork')
+
+    def start(self):
+        self.backend.subscribe(self.notify)
+        self.request_refresh()
+
+    def stop(self):
+        self.backend.close()
+        self._artwork_executor.shutdown(wait=False)
+
+    def flush_artwork(self, timeout=None):
+        try:
+            self._artwork_executor.submit(lambda: None).result(timeout)
+        except (RuntimeError, concurrent.futures.TimeoutError):
+            pass
+
+    def notify(self):
+        self.events_received += 1
+        self.request_refresh()
+
+    def request_refresh(self):
+        with self._lock:
+            if self._fetching:
+                if time.monotonic() - self._fetch_started < MEDIA_WATCHDOG_TIMEOUT:
+                    self._dirty = True
+                    return
+                stuck = self._future
+                self._future = None
+                self.watchdog_resets += 1
+            else:
+                stuck = None
+            self._fetching = True
+        if stuck is not None:
+            stuck.cancel()
+            self.backend.reset()
+        self._start_fetch()
+
+    def _start_fetch(self):
+        with self._lock:
+            self._fetch_started = time.monotonic()
+        try:
+            future = self.backend.fetch(self.known_titles(), self._want_artwork)
+        except Exception:
+            future = _completed_future([])
+        with self._lock:
+            self._future = future
+        future.add_done_callback(self._on_fetched)
+
+    def _on_fetched(self, future):
+        with self._lock:
+            if future is not self._future:
+                return
+        try:
+            states = future.result()
+        except TIMEOUT_ERRORS:
+            states = None
+            self.fetch_timeouts += 1
+        except Exception:
+            states = []
+        self.fetches += 1
+        if states is not None:
+            jobs = self._update_sessions(states)
+            if jobs:
+                self._submit_artwork(jobs)
+            elif not self._artwork_pending:
+                self._publish()
+        with self._lock:
+            if not self._dirty:
+                self._fetching = False
+                return
+            self._dirty = False
+        self._start_fetch()
+
+    def _want_artwork(self, track_key):
+        if track_key and self._recheck.get(track_key[0]) == track_key:
+            return True
+        return self.artwork_cache is None or not self.artwork_cache.knows(track_key)
+
+    def known_titles(self):
+        return {app_id: entry.state.title for app_id, entry in list(self.sessions.items()) if entry.state and app_id not in self._recheck}
+
+    def _resolve_artwork(self, thumbnail, track_key):
+        if self.artwork_cache is None:
+            return thumbnail
+        try:
+            if not thumbnail:
+                return self.artwork_cache.get(track_key)
+            artwork = self.artwork_cache.load(track_key, thumbnail)
+            if artwork is None:
+                self.artwork_cache.forget(track_key)
+            return artwork
+        except Exception as e:
+            print(f"Error decoding artwork: {e}")
+        return None
+
+    def _submit_artwork(self, jobs):
+        with self._lock:
+            self._artwork_pending += 1
+        try:
+            self._artwork_executor.submit(self._apply_artwork, jobs)
+        except RuntimeError:
+            with self._lock:
+                self._artwork_pending -= 1
+
+    def _apply_artwork(self, jobs):
+        try:
+            for entry, thumbnail, track_key in jobs:
+                artwork = self._resolve_artwork(thumbnail, track_key)
+                if entry.state is not None and entry.state.track_key == track_key:
+                    entry.artwork = artwork
         finally:
-            if self.stream:
-                self.stream.close()
-            if self.p:
-                self.p.terminate()
+            with self._lock:
+                self._artwork_pending -= 1
+        self._publish()
+
+    def _update_sessions(self, states):
+        now = self.clock()
+        sessions = {}
+        recheck = {}
+        jobs = []
+        for order, state in enumerate(states):
+            state = MediaState(*state)
+            app_id = state.track_key[0] if state.track_key else ""
+            entry = self.sessions.get(app_id) or MediaSession(app_id)
+            previous = entry.state
+            if previous is None or previous.title != state.title:
+                recheck[app_id] = state.track_key
+            if state.artwork or previous is None or previous.track_key != state.track_key:
+                if self.artwork_cache is None:
+                    entry.artwork = state.artwork or None
+                else:
+                    jobs.append((entry, state.artwork, state.track_key))
+            if state.is_playing or previous is None or previous.title != state.title or previous.is_playing != state.is_playing:
+                entry.last_active = now
+            entry.state = state._replace(artwork=None)
+            entry.order = order
+            sessions[app_id] = entry
+        self.sessions = sessions
+        self._recheck = recheck
+        return jobs
+
+    def select(self):
+        entries = list(self.sessions.values())
+        if not entries:
+            return None
+        if self.policy == 'app' and self.preferred_app:
+            preferred = [entry for entry in entries if self.preferred_app.lower() in entry.app_id.lower()]
+            if preferred:
+                entries = preferred
+        if self.policy == 'recent':
+            return max(entries, key=lambda entry: (entry.last_active, -entry.order))
+        return max(entries, key=lambda entry: (entry.state.is_playing, entry.last_active, -entry.order))
+
+    def _publish(self):
+        with self._publish_lock:
+            entry = self.select()
+            self.selected = entry.app_id if entry else None
+            state = entry.state._replace(artwork=entry.artwork) if entry else EMPTY_MEDIA_STATE
+            key = state._replace(artwork=getattr(state.artwork, 'content_hash', state.artwork is not None))
+            if key == self._last_key:
+                return
+            self._last_key = key
+            self.updates_emitted += 1
+            self.on_update(state)
+
+    def set_policy(self, policy, preferred_app=""):
+        self.policy = policy
+        self.preferred_app = preferred_app
+        self._publish()
+
+    def send_command(self, command):
+        return self.backend.send_command(command, self.selected)
+
+    def send_commands(self, commands):
+        return self.backend.send_commands(commands, self.selected)
+
+    def seek(self, position):
+        return self.backend.seek(position, self.selected)
+
+    def source_app_id(self):
+        if self.selected:
+            return _completed_future(self.selected)
+        return self.backend.source_app_id()
+
+
+class MediaCommandQueue:
+    def __init__(self, send, clock=time.monotonic, history=64):
+        self.send = send
+        self.clock = clock
+        self.history = history
+        self.pending = []
+        self.in_flight = False
+        self.sent = 0
+        self.cancelled = 0
+        self.latency = {}
+        self._lock = threading.Lock()
+
+    def submit(self, command):
+        with self._lock:
+            if command == "play_pause" and self.pending and self.pending[-1][0] == "play_pause":
+                self.pending.pop()
+                self.cancelled += 2
+            else:
+                self.pending.append((command, self.clock()))
+        self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            if self.in_flight or not self.pending:
+                return
+            batch = self.pending
+            self.pending = []
+            self.in_flight = True
+        try:
+            future = self.send([command for command, _ in batch])
+        except Exception:
+            future = _completed_future()
+        future.add_done_callback(lambda f: self._on_done(batch))
+
+    def _on_done(self, batch):
+        now = self.clock()
+        with self._lock:
+            for command, queued_at in batch:
+                self._record(command, now - queued_at)
+            self.sent += len(batch)
+            self.in_flight = False
+        self._dispatch()
+
+    def _record(self, name, seconds):
+        if name not in self.latency:
+            self.latency[name] = deque(maxlen=self.history)
+        self.latency[name].append(seconds)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._record(name, seconds)
+
+    def summary(self):
+        with self._lock:
+            latency = {name: list(values) for name, values in self.latency.items()}
+            summary = {'sent': self.sent, 'cancelled': self.cancelled}
+        for name, values in latency.items():
+            if values:
+                summary[name] = {
+                    'count': len(values),
+                    'mean_ms': round(sum(values) / len(values) * 1000.0, 2),
+                    'max_ms': round(max(values) * 1000.0, 2)
+                }
+        return summary
+
+
+class SeekScheduler:
+    def __init__(self, seek, rate=10, clock=time.monotonic):
+        self.seek = seek
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.clock = clock
+        self.pending = None
+        self.in_flight = False
+        self.last_sent = None
+        self.requested = 0
+        self.sent = 0
+        self._final = False
+        self._lock = threading.Lock()
+
+    def request(self, position):
+        with self._lock:
+            self.pending = position
+            self.requested += 1
+        self._dispatch()
+
+    def poll(self):
+        self._dispatch()
+
+    def flush(self):
+        self._dispatch(True)
+
+    def _dispatch(self, force=False):
+        with self._lock:
+            if self.pending is None:
+                return
+            if self.in_flight:
+                self._final = self._final or force
+                return
+            now = self.clock()
+            if not force and self.last_sent is not None and now - self.last_sent < self.interval:
+                return
+            position = self.pending
+            self.pending = None
+            self.in_flight = True
+            self.last_sent = now
+            self.sent += 1
+        try:
+            future = self.seek(position)
+        except Exception:
+            future = _completed_future(None)
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        with self._lock:
+            self.in_flight = False
+            force = self._final
+            self._final = False
+        self._dispatch(force)
+
+
+ART_DISPLAY_SIZE = 60
+
+
+def extract_artwork_colors(img):
+    if img.isNull():
+        return QColor(255, 255, 255), QColor(255, 255, 255)
+    scaled = img.scaled(1, 2, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    top_color = QColor(scaled.pixel(0, 0))
+    bottom_color = QColor(scaled.pixel(0, 1))
+    def brighten(c):
+        r, g, b = c.red(), c.green(), c.blue()
+        if (r + g + b) / 3 < 80:
+            return QColor(min(255, int(r * 2 + 50)), min(255, int(g * 2 + 50)), min(255, int(b * 2 + 50)))
+        return c
+    return brighten(top_color), brighten(bottom_color)
+
+
+class ScaledPixmapCache:
+    def __init__(self, max_items=128):
+        self.max_items = max_items
+        self.source = None
+        self.pixmaps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pixmap, size, dpr):
+        if pixmap is not self.source:
+            self.source = pixmap
+            self.pixmaps.clear()
+        key = (size, int(round(dpr * 100)))
+        scaled = self.pixmaps.get(key)
+        if scaled is not None:
+            self.pixmaps.move_to_end(key)
+            self.hits += 1
+            return scaled
+        self.misses += 1
+        physical = max(1, int(round(size * dpr)))
+        scaled = pixmap.scaled(physical, physical, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+        if scaled.width() > physical or scaled.height() > physical:
+            scaled = scaled.copy((scaled.width() - physical) // 2, (scaled.height() - physical) // 2, physical, physical)
+        scaled.setDevicePixelRatio(dpr)
+        self.pixmaps[key] = scaled
+        while len(self.pixmaps) > self.max_items:
+            self.pixmaps.popitem(last=False)
+        return scaled
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': len(self.pixmaps)
+        }
+
+
+class Artwork:
+    def __init__(self, image, colors, content_hash):
+        self.image = image
+        self.colors = colors
+        self.content_hash = content_hash
+        self._pixmap = None
+
+    @property
+    def pixmap(self):
+        if self._pixmap is None:
+            self._pixmap = QPixmap.fromImage(self.image)
+        return self._pixmap
+
+
+class ArtworkCache:
+    def __init__(self, size=ART_DISPLAY_SIZE, directory=ART_CACHE_DIR, memory_items=32, disk_bytes=32 * 1024 * 1024):
+        self.size = size
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.tracks = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index_file = os.path.join(directory, 'index.json')
+        try:
+            with open(self._index_file, 'r', encoding='utf-8') as f:
+                self.tracks = json.load(f)
+        except Exception:
+            self.tracks = {}
+
+    @staticmethod
+    def track_id(track_key):
+        return json.dumps(list(track_key), ensure_ascii=False)
+
+    def _path(self, content_hash):
+        return os.path.join(self.directory, content_hash + '.png')
+
+    def knows(self, track_key):
+        if not track_key:
+            return False
+        with self._lock:
+            content_hash = self.tracks.get(self.track_id(track_key))
+            if content_hash is None:
+                return False
+            if content_hash in self.memory:
+                return True
+        return os.path.exists(self._path(content_hash))
+
+    def forget(self, track_key):
+        if not track_key:
+            return False
+        with self._lock:
+            content_hash = self.tracks.pop(self.track_id(track_key), None)
+        if content_hash is None:
+            return False
+        try:
+            self._save_index()
+        except Exception as e:
+            print(f"Error saving artwork cache: {e}")
+        return True
+
+    def get(self, track_key):
+        if not track_key:
+            return None
+        with self._lock:
+            content_hash = self.tracks.get(self.track_id(track_key))
+        if content_hash is None:
+            self.misses += 1
+            return None
+        return self.get_by_hash(content_hash)
+
+    def get_by_hash(self, content_hash):
+        with self._lock:
+            artwork = self.memory.get(content_hash)
+            if artwork is not None:
+                self.memory.move_to_end(content_hash)
+                self.hits += 1
+                return artwork
+        path = self._path(content_hash)
+        image = QImage(path) if os.path.exists(path) else QImage()
+        if image.isNull():
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        artwork = self.build(image, content_hash)
+        with self._lock:
+            self.memory[content_hash] = artwork
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+        return artwork
+
+    def build(self, image, content_hash):
+        if image.width() > self.size or image.height() > self.size:
+            image = image.scaled(self.size, self.size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+        if image.width() > self.size or image.height() > self.size:
+            image = image.copy((image.width() - self.size) // 2, (image.height() - self.size) // 2, self.size, self.size)
+        return Artwork(image.convertToFormat(QImage.Format_ARGB32_Premultiplied), extract_artwork_colors(image), content_hash)
+
+    def load(self, track_key, data):
+        content_hash = hashlib.sha1(data).hexdigest()
+        artwork = self.get_by_hash(content_hash)
+        if artwork is None:
+            image = QImage()
+            if not image.loadFromData(data):
+                return None
+            artwork = self.build(image, content_hash)
+            self.put(track_key, artwork)
+        elif track_key and self.tracks.get(self.track_id(track_key)) != content_hash:
+            with self._lock:
+                self.tracks[self.track_id(track_key)] = content_hash
+            try:
+                self._save_index()
+            except Exception as e:
+                print(f"Error saving artwork cache: {e}")
+        return artwork
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+        }
+
+    def put(self, track_key, artwork):
+        with self._lock:
+            self.memory[artwork.content_hash] = artwork
+            self.memory.move_to_end(artwork.content_hash)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+            if track_key:
+                self.tracks[self.track_id(track_key)] = artwork.content_hash
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(artwork.content_hash)
+            if not os.path.exists(path):
+                artwork.image.save(path, 'PNG')
+                self._trim_disk()
+            self._save_index()
+        except Exception as e:
+            print(f"Error saving artwork cache: {e}")
+
+    def _trim_disk(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.png'):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _save_index(self):
+        with self._lock:
+            tracks = {key: value for key, value in self.tracks.items() if value in self.memory or os.path.exists(self._path(value))}
+            self.tracks = tracks
+        with open(self._index_file, 'w', encoding='utf-8') as f:
+            json.dump(tracks, f, ensure_ascii=False)
 
 
 class DynamicIsland(QWidget):
-    media_updated = pyqtSignal(bool, object, str, str, float, float)
+    media_updated = pyqtSignal(object)
 
-    def __init__(self):
+    def __init__(self, media_backend=None, clock=None):
         super().__init__()
+        self.clock = clock or time.monotonic
         
         self.config = load_config()
         
@@ -197,8 +2316,8 @@ class DynamicIsland(QWidget):
         self.is_media_playing = False
         self.is_expanded = False
         self.album_art = None
-        self.checking_media = False
-        self.eq_bars = [0.1] * 12
+        self.eq_bars = np.full(self.config.get('eq_bar_count', 6), 0.1, dtype=np.float32)
+        self._eq_band_buffer = None
         self.show_equalizer = self.config.get('show_equalizer', True)
         self.eq_color_from_art = self.config.get('eq_color_from_art', True)
         self.text_animation_enabled = self.config.get('text_animation', True)
@@ -215,7 +2334,7 @@ class DynamicIsland(QWidget):
         self.click_to_open_app = self.config.get('click_to_open_app', True)
         self.long_press_duration = self.config.get('long_press_duration', 250)
         self.show_time_remaining = self.config.get('show_time_remaining', True)
-        self.eq_bar_count = self.config.get('eq_bar_count', 6)
+        self.eq_bar_count = max(3, min(EQ_MAX_BARS, self.config.get('eq_bar_count', 6)))
         self.eq_sensitivity = self.config.get('eq_sensitivity', 100)
         self.text_animation_style = self.config.get('text_animation_style', 0)
         self.compact_corner_radius = self.config.get('compact_corner_radius', 20)
@@ -239,12 +2358,19 @@ class DynamicIsland(QWidget):
         self.eq_color_bottom = QColor(255, 255, 255)
         self.eq_color_top_target = QColor(255, 255, 255)
         self.eq_color_bottom_target = QColor(255, 255, 255)
-        self.audio_analyzer = AudioAnalyzer()
+        self._audio_demand = False
+        analyzer_class = ProcessAudioAnalyzer if self.config.get('audio_process', False) else AudioAnalyzer
+        self.audio_analyzer = analyzer_class(self.config.get('eq_fft_size', 2048), self.config.get('eq_hop_size', 1024), self.config.get('eq_window', 'hann'), band_count=self.eq_bar_count, band_scale=self.config.get('eq_band_scale', 'log'), fft_backend=self.config.get('eq_fft_backend', 'auto'))
+        self.frame_stats = FrameTimeStats()
         self.flip_angle = 0.0
         self.flip_animating = False
         self.new_album_art = None
         self.new_eq_colors = None
         self.last_thumbnail_hash = None
+        self.media_state = EMPTY_MEDIA_STATE
+        self.repaints_requested = 0
+        self.repaints_avoided = 0
+        self._visual_state = None
         self.track_title = ""
         self.track_artist = ""
         self.old_title = ""
@@ -264,7 +2390,8 @@ class DynamicIsland(QWidget):
         self.track_position = 0.0
         self.track_duration = 0.0
         self.server_position = 0.0
-        self.last_update_time = time.time()
+        self.last_update_time = self.clock()
+        self.position_offset = 0.0
         self.media_session = None
         self.press_timer = None
         self.expanded_y_offset = 20
@@ -318,10 +2445,26 @@ class DynamicIsland(QWidget):
         self._startup_animation_done = False
         QTimer.singleShot(100, self._animate_startup)
         
-        if MEDIA_AVAILABLE:
+        self.art_scale_cache = ScaledPixmapCache()
+        self.artwork_cache = ArtworkCache(int(math.ceil(ART_DISPLAY_SIZE * self.get_current_screen().devicePixelRatio())))
+        self.media_service = None
+        self.seek_scheduler = None
+        self.command_queue = None
+        self.pending_playing = None
+        self.pending_playing_since = 0.0
+        self.reported_playing = False
+        self.seek_timer = QTimer()
+        self.seek_timer.timeout.connect(self.poll_seek)
+        if media_backend is None and MEDIA_AVAILABLE:
+            media_backend = WinRTMediaBackend()
+        if media_backend is not None:
+            self.media_service = MediaService(media_backend, self.media_updated.emit, self.artwork_cache, self.config.get('media_session_policy', 'playing'), self.config.get('media_preferred_app', ''))
+            self.seek_scheduler = SeekScheduler(self.media_service.seek, self.config.get('seek_rate', 10))
+            self.command_queue = MediaCommandQueue(self.media_service.send_commands)
+            self.media_service.start()
             self.media_timer = QTimer()
             self.media_timer.timeout.connect(self.check_media)
-            self.media_timer.start(100)
+            self.media_timer.start(MEDIA_POLL_INTERVAL)
         
         self.eq_timer = QTimer()
         self.eq_timer.timeout.connect(self.update_equalizer)
@@ -383,6 +2526,13 @@ class DynamicIsland(QWidget):
     def lerp(self, a, b, t):
         return a + (b - a) * t
     
+    def eq_layout(self, count, bar_w, bar_gap, max_width):
+        total = count * bar_w + (count - 1) * bar_gap
+        if total <= max_width:
+            return bar_w, bar_gap, total
+        scale = max_width / float(total)
+        return bar_w * scale, bar_gap * scale, max_width
+
     def draw_interpolated(self, painter, progress):
         w, h = self.width(), self.height()
         
@@ -419,12 +2569,7 @@ class DynamicIsland(QWidget):
             painter.translate(-img_size / 2, -img_size / 2)
             
             size_int = int(img_size)
-            scaled = self.album_art.scaled(size_int, size_int, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            
-            if scaled.width() > size_int or scaled.height() > size_int:
-                x_off = (scaled.width() - size_int) // 2
-                y_off = (scaled.height() - size_int) // 2
-                scaled = scaled.copy(x_off, y_off, size_int, size_int)
+            scaled = self.art_scale_cache.get(self.album_art, size_int, self.devicePixelRatioF())
             
             if self.pause_progress > 0.01:
                 dim_factor = 1.0 - (self.pause_progress * 0.4)
@@ -445,15 +2590,13 @@ class DynamicIsland(QWidget):
             
             num_bars = min(self.eq_bar_count, len(self.eq_bars))
             
-            compact_bar_w, compact_bar_gap = 3, 2
+            compact_bar_w, compact_bar_gap, compact_total_w = self.eq_layout(num_bars, 3, 2, EQ_COMPACT_WIDTH)
             compact_eq_max_h = h - 16
-            compact_total_w = num_bars * compact_bar_w + (num_bars - 1) * compact_bar_gap
             compact_eq_x = w - compact_total_w - 12
             compact_eq_y = h / 2
             
-            expanded_bar_w, expanded_bar_gap = 4, 3
+            expanded_bar_w, expanded_bar_gap, expanded_total_w = self.eq_layout(num_bars, 4, 3, EQ_EXPANDED_WIDTH)
             expanded_eq_max_h = 50
-            expanded_total_w = num_bars * expanded_bar_w + (num_bars - 1) * expanded_bar_gap
             expanded_eq_x = w - 15 - expanded_total_w
             expanded_eq_y = 22 + expanded_eq_max_h / 2
             
@@ -472,7 +2615,7 @@ class DynamicIsland(QWidget):
                 gradient.setColorAt(0, self.eq_color_top)
                 gradient.setColorAt(1, self.eq_color_bottom)
                 painter.setBrush(QBrush(gradient))
-                painter.drawRoundedRect(int(x), int(y), int(bar_w), int(bar_height), 1, 1)
+                painter.drawRoundedRect(QRectF(x, y, bar_w, bar_height), 1, 1)
             
             painter.setOpacity(1.0)
         
@@ -504,8 +2647,7 @@ class DynamicIsland(QWidget):
         margin = 15
         
         text_x = margin + 70
-        bar_width, bar_gap, num_bars = 4, 3, 6
-        total_eq_width = num_bars * bar_width + (num_bars - 1) * bar_gap
+        total_eq_width = self.eq_layout(max(6, self.eq_bar_count), 4, 3, EQ_EXPANDED_WIDTH)[2]
         eq_x = w - margin - total_eq_width
         text_width = eq_x - text_x - 10
         
@@ -890,7 +3032,43 @@ class DynamicIsland(QWidget):
     def lerp_color(self, c1, c2, t):
         return QColor(int(c1.red() + (c2.red() - c1.red()) * t), int(c1.green() + (c2.green() - c1.green()) * t), int(c1.blue() + (c2.blue() - c1.blue()) * t))
 
+    def _update_audio_demand(self):
+        needed = self.show_equalizer and self.is_media_playing and not self.is_hidden
+        if needed != self._audio_demand:
+            self._audio_demand = needed
+            if needed:
+                self.audio_analyzer.acquire(self)
+            else:
+                self.audio_analyzer.release(self)
+
+    def extrapolated_position(self, now=None):
+        if not self.is_media_playing:
+            return self.server_position
+        if now is None:
+            now = self.clock()
+        position = self.server_position + (now - self.last_update_time)
+        return min(position, self.track_duration) if self.track_duration > 0 else position
+
+    def sync_track_position(self, position, is_playing):
+        now = self.clock()
+        error = self.extrapolated_position(now) + self.position_offset - position
+        self.server_position = position
+        self.last_update_time = now
+        self.position_offset = error if is_playing and abs(error) < POSITION_SNAP_THRESHOLD else 0.0
+        self.track_position = position + self.position_offset
+
+    def update_track_position(self):
+        if self.dragging_slider or not self.has_media_session:
+            return
+        self.position_offset *= 0.85
+        if abs(self.position_offset) < 0.01:
+            self.position_offset = 0.0
+        self.track_position = max(0.0, self.extrapolated_position() + self.position_offset)
+
     def update_equalizer(self):
+        self.frame_stats.tick()
+        self.update_track_position()
+        self._update_audio_demand()
         target_pause = 0.0 if self.is_media_playing else 1.0
         self.pause_progress += (target_pause - self.pause_progress) * 0.15
         
@@ -909,12 +3087,14 @@ class DynamicIsland(QWidget):
             self.mic_dot_opacity = self.mic_dot_target
         
         if self.is_media_playing:
-            bands = self.audio_analyzer.get_bands()
+            snapshot = self.audio_analyzer.read_bands(self._eq_band_buffer)
+            self._eq_band_buffer = bands = snapshot.bands
+            if time.monotonic() - snapshot.timestamp > 0.5:
+                bands.fill(0.0)
             sensitivity = self.eq_sensitivity / 100.0
-            for i in range(min(len(bands), len(self.eq_bars))):
-                adjusted_band = bands[i] * sensitivity
-                self.eq_bars[i] += (adjusted_band - self.eq_bars[i]) * 0.4
-                self.eq_bars[i] = max(0.1, min(1.0, self.eq_bars[i]))
+            if len(bands) == len(self.eq_bars):
+                self.eq_bars += (bands * sensitivity - self.eq_bars) * 0.4
+                np.clip(self.eq_bars, 0.1, 1.0, out=self.eq_bars)
             if self.eq_color_from_art:
                 self.eq_color_top = self.lerp_color(self.eq_color_top, self.eq_color_top_target, 0.1)
                 self.eq_color_bottom = self.lerp_color(self.eq_color_bottom, self.eq_color_bottom_target, 0.1)
@@ -973,7 +3153,46 @@ class DynamicIsland(QWidget):
             self.scroll_pause_start = 0
         
         if self.has_media_session or self.is_media_playing or self.mic_dot_opacity > 0.001 or self.mic_active:
-            self.update()
+            visual_state = self.visual_state()
+            self.request_repaint(visual_state != self._visual_state)
+            self._visual_state = visual_state
+
+    def visual_state(self):
+        eq = (self.eq_bars * 255).astype(np.uint8).tobytes() if self.is_media_playing and self.show_equalizer else None
+        return (
+            self.is_expanded, self.is_media_playing, self.has_media_session, eq,
+            round(self.pause_progress, 3), round(self.corner_radius_current, 2), round(self.compact_corner_radius_current, 2),
+            round(self.mic_dot_opacity, 2), self.eq_color_top.rgb(), self.eq_color_bottom.rgb(),
+            round(self.play_pause_scale, 2), self.play_pause_shrinking,
+            round(self.prev_scale, 2), round(self.prev_offset, 1), round(self.next_scale, 2), round(self.next_offset, 1),
+            round(self.text_anim_progress, 2), int(self.title_scroll_offset), int(self.artist_scroll_offset),
+            round(self.track_position, 1) if self.track_duration > 0 else None
+        )
+
+    def diagnostics(self):
+        analyzer = self.audio_analyzer
+        return {
+            'audio_mode': 'process' if isinstance(analyzer, ProcessAudioAnalyzer) else 'thread',
+            'audio_running': analyzer.running,
+            'audio_active': analyzer.active,
+            'audio_errors': analyzer.error_count,
+            'audio_restarts': analyzer.restart_count,
+            'audio_last_error': analyzer.last_error,
+            'fft_backend': analyzer.fft_backend,
+            'fft_benchmarks_us': {size: {name: round(t * 1e6, 1) for name, t in results.items()} for size, results in getattr(analyzer, 'fft_benchmarks', FFT_BENCHMARKS).items()},
+            'frame_time': self.frame_stats.summary(),
+            'artwork_cache': self.artwork_cache.stats(),
+            'art_scale_cache': self.art_scale_cache.stats(),
+            'repaints_requested': self.repaints_requested,
+            'repaints_avoided': self.repaints_avoided,
+            'seeks_requested': self.seek_scheduler.requested if self.seek_scheduler else 0,
+            'seeks_sent': self.seek_scheduler.sent if self.seek_scheduler else 0,
+            'media_commands': self.command_queue.summary() if self.command_queue else {},
+            'media_sessions': sorted(self.media_service.sessions) if self.media_service else [],
+            'media_selected_session': self.media_service.selected if self.media_service else None,
+            'media_fetch_timeouts': self.media_service.fetch_timeouts if self.media_service else 0,
+            'media_watchdog_resets': self.media_service.watchdog_resets if self.media_service else 0
+        }
 
     def update_flip(self):
         if not self.flip_animating:
@@ -1032,119 +3251,65 @@ class DynamicIsland(QWidget):
         return self.media_width if (self.is_media_playing or self.has_media_session) else self.base_width
 
     def check_media(self):
-        if self.checking_media:
-            return
-        self.checking_media = True
-        threading.Thread(target=self._check_media_thread, daemon=True).start()
+        if self.media_service:
+            self.media_service.request_refresh()
 
-    def _check_media_thread(self):
-        async def get_media_info():
-            try:
-                manager = await MediaManager.request_async()
-                session = manager.get_current_session()
-                if session:
-                    info = session.get_playback_info()
-                    is_playing = info.playback_status == PlaybackStatus.PLAYING
-                    thumbnail = None
-                    title = ""
-                    artist = ""
-                    position = 0.0
-                    duration = 0.0
-                    
-                    try:
-                        timeline = session.get_timeline_properties()
-                        if timeline:
-                            position = timeline.position.total_seconds()
-                            duration = timeline.end_time.total_seconds()
-                    except:
-                        pass
-                    
-                    try:
-                        media_props = await session.try_get_media_properties_async()
-                        if media_props:
-                            title = media_props.title or ""
-                            artist = media_props.artist or ""
-                            if title != self.track_title and media_props.thumbnail:
-                                try:
-                                    stream = await media_props.thumbnail.open_read_async()
-                                    size = stream.size
-                                    buffer = Buffer(size)
-                                    await stream.read_async(buffer, size, InputStreamOptions.READ_AHEAD)
-                                    reader = DataReader.from_buffer(buffer)
-                                    thumbnail = bytes([reader.read_byte() for _ in range(size)])
-                                except:
-                                    pass
-                    except:
-                        pass
-                    return is_playing, thumbnail, title, artist, position, duration
-            except:
-                pass
-            return False, None, "", "", 0.0, 0.0
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(get_media_info())
-            loop.close()
-        except:
-            result = (False, None, "", "", 0.0, 0.0)
-        self.media_updated.emit(*result)
-
-    def extract_colors_from_image(self, img):
-        if img.isNull():
-            return QColor(255, 255, 255), QColor(255, 255, 255)
-        scaled = img.scaled(1, 2, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-        top_color = QColor(scaled.pixel(0, 0))
-        bottom_color = QColor(scaled.pixel(0, 1))
-        def brighten(c):
-            r, g, b = c.red(), c.green(), c.blue()
-            if (r + g + b) / 3 < 80:
-                return QColor(min(255, int(r * 2 + 50)), min(255, int(g * 2 + 50)), min(255, int(b * 2 + 50)))
-            return c
-        return brighten(top_color), brighten(bottom_color)
-
-    def on_media_updated(self, is_playing, thumbnail, title, artist, position, duration):
-        self.checking_media = False
-        
-        if title != self.track_title and title and self.text_animation_enabled:
-            self.old_title = self.track_title
-            self.old_artist = self.track_artist
-            self.text_anim_progress = 0.0
-            self.text_animating = True
-        
-        self.track_title = title
-        self.track_artist = artist
-        self.track_duration = duration
-        
-        if not self.dragging_slider:
-            self.track_position = position
-        
-        has_session = thumbnail is not None or title or artist or duration > 0
-        
-        if thumbnail:
-            thumb_hash = hash(thumbnail)
-            if thumb_hash != self.last_thumbnail_hash:
-                self.last_thumbnail_hash = thumb_hash
-                img = QImage()
-                img.loadFromData(thumbnail)
-                new_art = QPixmap.fromImage(img)
-                new_colors = self.extract_colors_from_image(img)
+    def on_media_updated(self, state):
+        self.reported_playing = state.is_playing
+        if self.pending_playing is not None:
+            if state.is_playing == self.pending_playing:
+                if self.command_queue:
+                    self.command_queue.record("play_pause_confirmed", self.clock() - self.pending_playing_since)
+                self.pending_playing = None
+            else:
+                state = state._replace(is_playing=self.pending_playing)
+        previous = self.media_state
+        self.media_state = state
+        changed = False
+        
+        if state.title != previous.title or state.artist != previous.artist:
+            if state.title != self.track_title and state.title and self.text_animation_enabled:
+                self.old_title = self.track_title
+                self.old_artist = self.track_artist
+                self.text_anim_progress = 0.0
+                self.text_animating = True
+            self.track_title = state.title
+            self.track_artist = state.artist
+            changed = True
+        
+        if state.duration != previous.duration:
+            self.track_duration = state.duration
+            changed = True
+        
+        if not self.dragging_slider and (state.position != previous.position or state.is_playing != previous.is_playing):
+            self.sync_track_position(state.position, state.is_playing)
+        
+        has_session = bool(state.artwork is not None or state.title or state.artist or state.duration > 0)
+        
+        artwork = state.artwork
+        if artwork is not None:
+            if artwork.content_hash != self.last_thumbnail_hash:
+                self.last_thumbnail_hash = artwork.content_hash
                 if self.album_art and self.is_media_playing and not self.flip_animating and self.flip_animation_enabled:
-                    self.start_flip_animation(new_art, new_colors)
+                    self.start_flip_animation(artwork.pixmap, artwork.colors)
                 else:
-                    self.album_art = new_art
-                    self.eq_color_top_target, self.eq_color_bottom_target = new_colors
-        elif not has_session:
+                    self.album_art = artwork.pixmap
+                    self.eq_color_top_target, self.eq_color_bottom_target = artwork.colors
+                changed = True
+        elif not has_session and self.album_art is not None:
             self.album_art = None
             self.last_thumbnail_hash = None
             self.eq_color_top_target = QColor(255, 255, 255)
             self.eq_color_bottom_target = QColor(255, 255, 255)
+            changed = True
         
         session_changed = has_session != self.has_media_session
-        playing_changed = is_playing != self.is_media_playing
+        playing_changed = state.is_playing != self.is_media_playing
         self.has_media_session = has_session
         
         if playing_changed or session_changed:
-            self.is_media_playing = is_playing
+            self.is_media_playing = state.is_playing
+            changed = True
             if not self.is_expanded:
                 if has_session:
                     if self.is_hidden and self.autohide:
@@ -1156,13 +3321,15 @@ class DynamicIsland(QWidget):
                         self.hide_island()
                     else:
                         self.animate_to(self.base_width, self.base_height)
-            if is_playing:
-                self.audio_analyzer.start()
-            else:
-                self.audio_analyzer.stop()
-        if is_playing and not self.audio_analyzer.running:
-            self.audio_analyzer.start()
-        self.update()
+            self._update_audio_demand()
+        self.request_repaint(changed)
+
+    def request_repaint(self, changed):
+        if changed:
+            self.repaints_requested += 1
+            self.update()
+        else:
+            self.repaints_avoided += 1
 
     def get_current_screen(self):
         screens = QApplication.screens()
@@ -1215,26 +3382,33 @@ class DynamicIsland(QWidget):
         self.animate_to(target_w, self.base_height, expanded=False)
 
     def send_media_command(self, command):
-        threading.Thread(target=self._send_command_thread, args=(command,), daemon=True).start()
+        if not self.command_queue:
+            return
+        if command == "play_pause" and self.has_media_session:
+            self.pending_playing_since = self.clock()
+            if self.pending_playing is None:
+                self.pending_playing = not self.reported_playing
+            else:
+                self.pending_playing = not self.pending_playing
+            if self.pending_playing == self.reported_playing:
+                self.pending_playing = None
+            self.set_playing_state(not self.is_media_playing)
+            QTimer.singleShot(int(OPTIMISTIC_TIMEOUT * 1000) + 50, self.reconcile_playing)
+        self.command_queue.submit(command)
 
-    def _send_command_thread(self, command):
-        async def send():
-            try:
-                manager = await MediaManager.request_async()
-                session = manager.get_current_session()
-                if session:
-                    if command == "play_pause":
-                        await session.try_toggle_play_pause_async()
-                    elif command == "next":
-                        await session.try_skip_next_async()
-                    elif command == "prev":
-                        await session.try_skip_previous_async()
-            except:
-                pass
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(send())
-        loop.close()
+    def set_playing_state(self, is_playing):
+        if is_playing != self.is_media_playing:
+            self.server_position = self.extrapolated_position()
+            self.last_update_time = self.clock()
+            self.is_media_playing = is_playing
+            self._update_audio_demand()
+            self.update()
+
+    def reconcile_playing(self):
+        if self.pending_playing is not None and self.clock() - self.pending_playing_since >= OPTIMISTIC_TIMEOUT:
+            self.pending_playing = None
+            self.media_state = self.media_state._replace(is_playing=self.reported_playing)
+            self.set_playing_state(self.reported_playing)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -1321,7 +3495,10 @@ class DynamicIsland(QWidget):
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.LeftButton:
             if self.dragging_slider:
+                self.update_slider_position(event.pos().x())
                 self.dragging_slider = False
+                if self.seek_scheduler:
+                    self.seek_scheduler.flush()
             if self.press_timer and self.press_timer.isActive():
                 self.press_timer.stop()
                 if self.has_media_session and self.click_to_open_app and not self.is_expanded:
@@ -1339,24 +3516,17 @@ class DynamicIsland(QWidget):
             self.open_media_app()
     
     def open_media_app(self):
-        threading.Thread(target=self._open_media_app_thread, daemon=True).start()
+        if self.media_service:
+            self.media_service.source_app_id().add_done_callback(self._on_source_app_id)
     
-    def _open_media_app_thread(self):
-        async def activate():
-            try:
-                manager = await MediaManager.request_async()
-                session = manager.get_current_session()
-                if session:
-                    source_app_id = session.source_app_user_model_id
-                    if source_app_id:
-                        app_name = source_app_id.replace('.exe', '').split('\\')[-1].split('!')[-1].lower()
-                        self._activate_window_by_name(app_name)
-            except:
-                pass
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(activate())
-        loop.close()
+    def _on_source_app_id(self, future):
+        try:
+            source_app_id = future.result()
+            if source_app_id:
+                app_name = source_app_id.replace('.exe', '').split('\\')[-1].split('!')[-1].lower()
+                self._activate_window_by_name(app_name)
+        except:
+            pass
     
     def _activate_window_by_name(self, app_name):
         import ctypes
@@ -1407,27 +3577,23 @@ class DynamicIsland(QWidget):
         sx, sy, sw, sh = self.slider_rect
         progress = max(0, min(1, (x - sx) / sw))
         new_position = progress * self.track_duration
-        self.track_position = new_position
+        self.track_position = self.server_position = new_position
+        self.last_update_time = self.clock()
+        self.position_offset = 0.0
         self.seek_to_position(new_position)
         self.update()
     
     def seek_to_position(self, position):
-        threading.Thread(target=self._seek_thread, args=(position,), daemon=True).start()
-    
-    def _seek_thread(self, position):
-        async def seek():
-            try:
-                manager = await MediaManager.request_async()
-                session = manager.get_current_session()
-                if session:
-                    from datetime import timedelta
-                    await session.try_change_playback_position_async(int(position * 10000000))
-            except:
-                pass
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(seek())
-        loop.close()
+        if self.seek_scheduler:
+            self.seek_scheduler.request(position)
+            if self.dragging_slider and not self.seek_timer.isActive():
+                self.seek_timer.start(max(10, int(self.seek_scheduler.interval * 1000)))
+
+    def poll_seek(self):
+        if self.seek_scheduler:
+            self.seek_scheduler.poll()
+            if not self.dragging_slider and self.seek_scheduler.pending is None:
+                self.seek_timer.stop()
     
     def on_long_press(self):
         self.is_pressing = False
@@ -1454,11 +3620,15 @@ class DynamicIsland(QWidget):
 
     def closeEvent(self, event):
         self.audio_analyzer.stop()
+        if self.media_service:
+            self.media_service.stop()
         event.accept()
     
     def apply_settings(self, config):
         self.config = config
         self.top_offset = config.get('top_offset', 15)
+        if self.media_service:
+            self.media_service.set_policy(config.get('media_session_policy', 'playing'), config.get('media_preferred_app', ''))
         self.show_equalizer = config.get('show_equalizer', True)
         self.eq_color_from_art = config.get('eq_color_from_art', True)
         self.text_animation_enabled = config.get('text_animation', True)
@@ -1474,8 +3644,12 @@ class DynamicIsland(QWidget):
         self.click_to_open_app = config.get('click_to_open_app', True)
         self.long_press_duration = config.get('long_press_duration', 250)
         self.show_time_remaining = config.get('show_time_remaining', True)
-        self.eq_bar_count = config.get('eq_bar_count', 6)
+        self.eq_bar_count = max(3, min(EQ_MAX_BARS, config.get('eq_bar_count', 6)))
+        if len(self.eq_bars) != self.eq_bar_count:
+            self.eq_bars = np.full(self.eq_bar_count, 0.1, dtype=np.float32)
+        self.audio_analyzer.set_band_count(self.eq_bar_count, config.get('eq_band_scale', 'log'))
         self.eq_sensitivity = config.get('eq_sensitivity', 100)
+        self.audio_analyzer.configure(config.get('eq_fft_size', 2048), config.get('eq_hop_size', 1024), config.get('eq_window', 'hann'), config.get('eq_fft_backend', 'auto'))
         self.double_click_action = config.get('double_click_action', 0)
         self.show_progress_bar = config.get('show_progress_bar', True)
         self.autohide = config.get('autohide', False)
@@ -2233,7 +4407,7 @@ class SettingsWindow(QWidget):
         self.eq_bars_lbl = QLabel(self.tr['eq_bars'])
         eq_bars_layout.addWidget(self.eq_bars_lbl)
         self.eq_bars_spin = QSpinBox()
-        self.eq_bars_spin.setRange(3, 12)
+        self.eq_bars_spin.setRange(3, EQ_MAX_BARS)
         self.eq_bars_spin.setValue(self.config['eq_bar_count'])
         eq_bars_layout.addWidget(self.eq_bars_spin)
         eq_bars_layout.addStretch()
@@ -2614,6 +4788,7 @@ class TrayIcon(QSystemTrayIcon):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)
     
@@ -2627,8 +4802,31 @@ if __name__ == '__main__':
         if os.path.exists(font_path):
             QFontDatabase.addApplicationFont(font_path)
     
-    island = DynamicIsland()
+    scenario = None
+    if '--scenario' in sys.argv:
+        clock = FakeClock()
+        backend = FakeMediaBackend(clock)
+        scenario = MediaScenario.load(sys.argv[sys.argv.index('--scenario') + 1], backend, clock)
+        island = DynamicIsland(backend, clock)
+    else:
+        island = DynamicIsland()
     island.show()
+    app.aboutToQuit.connect(lambda: island.audio_analyzer.stop())
+    
+    if scenario:
+        def advance_scenario():
+            scenario.advance(0.016)
+            if scenario.finished and scenario.clock() - scenario.start > scenario.duration + 1.0:
+                print(json.dumps(island.diagnostics()))
+                app.quit()
+        scenario_timer = QTimer()
+        scenario_timer.timeout.connect(advance_scenario)
+        scenario_timer.start(16)
+    
+    if '--diagnostics' in sys.argv:
+        diagnostics_timer = QTimer()
+        diagnostics_timer.timeout.connect(lambda: print(json.dumps(island.diagnostics())))
+        diagnostics_timer.start(5000)
     
     hover_zone = HoverZone(island)
     hover_zone.show()
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['APPDATA'] = tempfile.mkdtemp(prefix='island-tests-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    app = QApplication.instance() or QApplication([])
+    yield app
@@ -0,0 +1,260 @@
+import functools
+import threading
+import time
+import types
+
+import dynamic_island as di
+
+
+class CountingSource(di.SyntheticAudioSource):
+    def __init__(self):
+        super().__init__('pink_noise', rate=48000, channels=2, realtime=True, block=256)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.max_open = 0
+
+    def open(self):
+        with self.lock:
+            self.opened += 1
+            self.max_open = max(self.max_open, self.opened - self.closed)
+        super().open()
+
+    def close(self):
+        super().close()
+        with self.lock:
+            self.closed += 1
+
+    def stream_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+class FailingSource(di.AudioSource):
+    def __init__(self):
+        super().__init__()
+        self.opened_at = []
+
+    def open(self):
+        self.opened_at.append(time.monotonic())
+        raise OSError("device unavailable")
+
+
+class FakeStream:
+    def __init__(self):
+        self.active = True
+        self.closed = False
+
+    def is_active(self):
+        return self.active
+
+    def start_stream(self):
+        self.active = True
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeHost:
+    def __init__(self, provider):
+        self.provider = provider
+
+    def open(self, **kwargs):
+        stream = FakeStream()
+        self.provider.streams.append(stream)
+        return stream
+
+    def terminate(self):
+        self.provider.terminated += 1
+
+
+class FakeProvider(di.AudioDeviceProvider):
+    def __init__(self):
+        self.device_id = 'speakers'
+        self.hosts = 0
+        self.terminated = 0
+        self.streams = []
+
+    def create_host(self):
+        self.hosts += 1
+        return FakeHost(self)
+
+    def default_device_id(self):
+        return self.device_id
+
+    def resolve_loopback(self, p):
+        return {'index': 0, 'defaultSampleRate': 48000, 'maxInputChannels': 2}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def capture_workers():
+    return [t for t in threading.enumerate() if getattr(t, '_target', None) is not None and getattr(t._target, '__name__', '') == '_capture_loop']
+
+
+def test_start_stop_toggles_keep_single_worker():
+    source = CountingSource()
+    analyzer = di.AudioAnalyzer(512, 256, source=source, fft_backend='numpy')
+    for i in range(2000):
+        analyzer.start()
+        if i % 3 == 0:
+            analyzer.pause()
+            analyzer.start()
+        analyzer.stop(timeout=0 if i % 2 else 2.0)
+        assert len(capture_workers()) <= 1
+    assert analyzer.stop(timeout=2.0)
+    assert analyzer.state == di.ANALYZER_STOPPED
+    assert capture_workers() == []
+    assert source.max_open <= 1
+    assert source.opened == source.closed
+    assert not source.stream_alive()
+
+
+def test_consumers_share_one_worker():
+    source = CountingSource()
+    analyzer = di.AudioAnalyzer(512, 256, source=source, fft_backend='numpy')
+    consumers = [object() for _ in range(4)]
+    for _ in range(500):
+        for consumer in consumers:
+            analyzer.acquire(consumer)
+        for consumer in consumers:
+            analyzer.release(consumer)
+        assert len(capture_workers()) <= 1
+    assert analyzer.workers_started == 1
+    assert analyzer.stop(timeout=2.0)
+    assert source.opened == source.closed
+    assert not source.stream_alive()
+
+
+def test_hot_loop_allocations_stay_flat():
+    import tracemalloc
+    import numpy as np
+
+    analyzer = di.AudioAnalyzer(2048, 512, source=CountingSource(), band_count=12, fft_backend='numpy')
+    analyzer._rate = 48000
+    analyzer._channels = 2
+    analyzer._build_frame_buffers()
+    source = di.SyntheticAudioSource('pink_noise', channels=2, realtime=False, block=512)
+    source.open()
+    blocks = [source._next_block() for _ in range(8)]
+    out = np.zeros(analyzer.band_count, dtype=np.float32)
+
+    def run(frames):
+        for i in range(frames):
+            analyzer._on_samples(blocks[i % len(blocks)])
+            analyzer._process_pending()
+            analyzer.read_bands(out)
+
+    run(500)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        analyzed = analyzer.frames_analyzed
+        run(5000)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert analyzer.frames_analyzed - analyzed >= 4900
+    assert current - before < 16 * 1024
+    assert peak - before < 128 * 1024
+
+
+def test_process_mode_resolves_backend_in_child():
+    analyzer = di.ProcessAudioAnalyzer(512, 256, fft_backend='auto', source_factory=functools.partial(di.SyntheticAudioSource, 'pink_noise', block=256))
+    analyzer.acquire('eq')
+    try:
+        deadline = time.monotonic() + 10.0
+        while analyzer.fft_backend is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert analyzer.fft_backend in di.available_fft_backends()
+        assert 512 in analyzer.fft_benchmarks
+        assert analyzer.read_bands().seq > 0
+    finally:
+        assert analyzer.stop()
+
+
+def analyze_file(path):
+    source = di.FileAudioSource(path, realtime=False, loop=False)
+    analyzer = di.AudioAnalyzer(2048, 1024, source=source, band_count=12, fft_backend='numpy')
+    analyzer.start()
+    try:
+        deadline = time.monotonic() + 30.0
+        while not (analyzer.frames_analyzed and not source._running) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return analyzer.frames_analyzed, analyzer.get_bands().copy()
+    finally:
+        assert analyzer.stop()
+
+
+def test_offline_file_analysis_is_deterministic(tmp_path):
+    import wave
+    import numpy as np
+
+    path = str(tmp_path / 'sweep.wav')
+    source = di.SyntheticAudioSource('sine_sweep', rate=48000, channels=2, realtime=False, block=48000)
+    source.open()
+    samples = np.concatenate([source._next_block() for _ in range(10)])
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(48000)
+        f.writeframes((samples * 32767).astype('<i2').tobytes())
+    expected = (480000 - 2048) // 1024 + 1
+    runs = [analyze_file(path) for _ in range(3)]
+    for frames, bands in runs:
+        assert frames == expected
+        assert np.array_equal(bands, runs[0][1])
+    assert runs[0][1].any()
+
+
+def test_open_failures_back_off_exponentially():
+    source = FailingSource()
+    analyzer = di.AudioAnalyzer(512, 256, source=source, fft_backend='numpy')
+    analyzer.min_backoff = 0.05
+    analyzer.max_backoff = 0.4
+    analyzer.start()
+    try:
+        assert wait_for(lambda: len(source.opened_at) >= 7)
+    finally:
+        assert analyzer.stop()
+    gaps = [b - a for a, b in zip(source.opened_at, source.opened_at[1:])][:6]
+    for gap, expected in zip(gaps, [0.05, 0.1, 0.2, 0.4, 0.4, 0.4]):
+        assert expected * 0.9 <= gap < expected + 0.15
+    assert analyzer.error_count == len(source.opened_at)
+    assert analyzer.restart_count >= len(source.opened_at) - 1
+    assert 'device unavailable' in analyzer.last_error
+
+
+def test_default_device_change_and_dead_stream_reopen(monkeypatch):
+    monkeypatch.setattr(di, 'pyaudio', types.SimpleNamespace(paFloat32=1, paContinue=0), raising=False)
+    provider = FakeProvider()
+    analyzer = di.AudioAnalyzer(512, 256, source=di.WasapiLoopbackSource(devices=provider), fft_backend='numpy')
+    analyzer.device_check_interval = 0.02
+    analyzer.min_backoff = 0.01
+    analyzer.start()
+    try:
+        assert wait_for(lambda: len(provider.streams) == 1)
+        provider.device_id = 'headphones'
+        assert wait_for(lambda: len(provider.streams) == 2)
+        assert analyzer.device_changes == 1
+        assert analyzer.error_count == 0
+        assert provider.streams[0].closed
+        assert provider.hosts == 2 and provider.terminated == 1
+        provider.streams[1].active = False
+        assert wait_for(lambda: len(provider.streams) == 3)
+        assert analyzer.device_changes == 1
+        assert analyzer.error_count == 1
+        assert 'audio stream stopped' in analyzer.last_error
+        assert analyzer.restart_count == 2
+    finally:
+        assert analyzer.stop()
+    assert provider.streams[2].closed
+    assert provider.terminated == provider.hosts
@@ -0,0 +1,145 @@
+import os
+import threading
+
+import dynamic_island as di
+
+SCENARIO = os.path.join(os.path.dirname(__file__), 'scenarios', 'playback.json')
+
+
+def run_until(scenario, at, on_step=None):
+    while not scenario.finished and scenario.clock() - scenario.start < at:
+        scenario.advance(0.05)
+        if on_step:
+            on_step()
+
+
+class ThreadRecordingCache(di.ArtworkCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = set()
+
+    def load(self, track_key, data):
+        self.threads.add(threading.current_thread().name)
+        return super().load(track_key, data)
+
+
+def test_scenario_drives_media_service(qapp, tmp_path):
+    clock = di.FakeClock()
+    backend = di.FakeMediaBackend(clock)
+    updates = []
+    cache = ThreadRecordingCache(directory=str(tmp_path))
+    service = di.MediaService(backend, updates.append, cache, clock=clock)
+    service.start()
+    scenario = di.MediaScenario.load(SCENARIO, backend, clock)
+    flush = lambda: service.flush_artwork(5.0)
+
+    run_until(scenario, 4.9, flush)
+    service.request_refresh()
+    flush()
+    first = updates[-1]
+    assert first.title == "First Song" and first.is_playing
+    assert abs(first.position - 4.8) < 0.2
+    first_art = first.artwork.content_hash
+
+    run_until(scenario, 5.5, flush)
+    assert updates[-1].artwork.content_hash != first_art
+    assert backend.position("Spotify.exe") > 5.0
+
+    run_until(scenario, 6.5, flush)
+    assert not updates[-1].is_playing
+    paused_at = backend.position("Spotify.exe")
+    run_until(scenario, 6.9, flush)
+    assert backend.position("Spotify.exe") == paused_at
+
+    run_until(scenario, 8.5, flush)
+    assert abs(updates[-1].position - 90) < 0.6
+
+    run_until(scenario, 11.0, flush)
+    assert service.selected == "chrome.exe"
+    assert updates[-1].title == "Video"
+
+    run_until(scenario, 14.5, flush)
+    assert service.selected == "Spotify.exe"
+    assert updates[-1].title == "Second Song"
+
+    scenario.run(0.05, flush)
+    assert updates[-1] == di.EMPTY_MEDIA_STATE
+    assert service.sessions == {}
+    assert cache.threads and all(name.startswith('artwork') for name in cache.threads)
+    service.stop()
+
+
+def test_scenario_runs_island_through_pauses(qapp):
+    clock = di.FakeClock()
+    backend = di.FakeMediaBackend(clock)
+    island = di.DynamicIsland(backend, clock)
+    scenario = di.MediaScenario.load(SCENARIO, backend, clock)
+    seen_paused = []
+
+    def step():
+        island.media_service.flush_artwork(5.0)
+        island.update_equalizer()
+        qapp.processEvents()
+        if island.has_media_session and not island.is_media_playing:
+            seen_paused.append(clock())
+
+    try:
+        run_until(scenario, 6.5, step)
+        assert island.track_title == "First Song"
+        assert seen_paused
+        assert abs(island.track_position - backend.position("Spotify.exe")) < 0.5
+        scenario.run(0.05, step)
+        assert not island.has_media_session
+        assert island.album_art is None
+    finally:
+        island.audio_analyzer.stop()
+        island.media_service.stop()
+        island.close()
+
+
+def test_stale_persisted_artwork_is_rechecked_once(qapp, tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'Play.png'), 'rb') as f:
+        wrong = f.read()
+    with open(os.path.join(root, 'Pause.png'), 'rb') as f:
+        right = f.read()
+    key = ("Spotify.exe", "Song", "Artist", "Album")
+    stale = di.ArtworkCache(directory=str(tmp_path))
+    wrong_hash = stale.load(key, wrong).content_hash
+    assert di.ArtworkCache(directory=str(tmp_path)).knows(key)
+
+    clock = di.FakeClock()
+    backend = di.FakeMediaBackend(clock)
+    backend.update("Spotify.exe", title="Song", artist="Artist", album="Album", duration=100.0, thumbnail=right)
+    updates = []
+    service = di.MediaService(backend, updates.append, di.ArtworkCache(directory=str(tmp_path)), clock=clock)
+    service.start()
+    service.flush_artwork(5.0)
+    assert updates[-1].artwork.content_hash == wrong_hash
+
+    service.request_refresh()
+    service.flush_artwork(5.0)
+    right_hash = updates[-1].artwork.content_hash
+    assert right_hash != wrong_hash
+    assert di.ArtworkCache(directory=str(tmp_path)).get(key).content_hash == right_hash
+
+    delivered = []
+    fetch = backend.fetch
+
+    def recording_fetch(*args):
+        future = fetch(*args)
+        delivered.extend(state.artwork for state in future.result())
+        return future
+
+    backend.fetch = recording_fetch
+    service.request_refresh()
+    service.flush_artwork(5.0)
+    assert delivered == [None]
+    assert updates[-1].artwork.content_hash == right_hash
+    service.stop()
+
+    cache = di.ArtworkCache(directory=str(tmp_path))
+    assert cache.forget(key)
+    assert not cache.knows(key)
+    assert not di.ArtworkCache(directory=str(tmp_path)).knows(key)
+    assert not cache.forget(key)
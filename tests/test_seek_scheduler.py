@@ -0,0 +1,79 @@
+import concurrent.futures
+
+import dynamic_island as di
+
+
+class HeldSeeks:
+    def __init__(self):
+        self.calls = []
+        self.futures = []
+
+    def seek(self, position):
+        self.calls.append(position)
+        future = concurrent.futures.Future()
+        self.futures.append(future)
+        return future
+
+    def complete(self):
+        self.futures.pop(0).set_result(None)
+
+
+def test_in_flight_seeks_coalesce_to_latest():
+    session = HeldSeeks()
+    clock = di.FakeClock()
+    scheduler = di.SeekScheduler(session.seek, rate=10, clock=clock)
+    scheduler.request(1.0)
+    for position in range(2, 50):
+        clock.advance(0.5)
+        scheduler.request(float(position))
+    assert session.calls == [1.0]
+    session.complete()
+    assert session.calls == [1.0, 49.0]
+    session.complete()
+    assert scheduler.pending is None
+    assert scheduler.requested == 49
+    assert scheduler.sent == 2
+
+
+def test_rate_limit_under_fake_clock():
+    clock = di.FakeClock()
+    backend = di.FakeMediaBackend(clock)
+    scheduler = di.SeekScheduler(backend.seek, rate=10, clock=clock)
+    for i in range(100):
+        scheduler.request(float(i))
+        clock.advance(0.01)
+    assert len(backend.seeks) == 10
+    assert backend.seeks[0] == 0.0
+    assert all(b - a >= 9 for a, b in zip(backend.seeks, backend.seeks[1:]))
+    assert scheduler.pending == 99.0
+    scheduler.poll()
+    assert len(backend.seeks) == 10
+    clock.advance(0.1)
+    scheduler.poll()
+    assert backend.seeks[-1] == 99.0
+
+
+def test_flush_sends_final_position_despite_rate_limit():
+    clock = di.FakeClock()
+    backend = di.FakeMediaBackend(clock)
+    scheduler = di.SeekScheduler(backend.seek, rate=2, clock=clock)
+    scheduler.request(10.0)
+    scheduler.request(20.0)
+    scheduler.request(30.0)
+    assert backend.seeks == [10.0]
+    scheduler.flush()
+    assert backend.seeks == [10.0, 30.0]
+    scheduler.flush()
+    assert backend.seeks == [10.0, 30.0]
+
+
+def test_flush_while_in_flight_sends_after_completion():
+    session = HeldSeeks()
+    clock = di.FakeClock()
+    scheduler = di.SeekScheduler(session.seek, rate=1, clock=clock)
+    scheduler.request(5.0)
+    scheduler.request(7.0)
+    scheduler.flush()
+    assert session.calls == [5.0]
+    session.complete()
+    assert session.calls == [5.0, 7.0]
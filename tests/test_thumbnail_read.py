@@ -0,0 +1,78 @@
+import time
+
+import dynamic_island as di
+
+SIZE = 300 * 1024
+
+
+class FakeBuffer(bytearray):
+    @property
+    def length(self):
+        return len(self)
+
+
+class OpaqueBuffer:
+    def __init__(self, data):
+        self.data = bytes(data)
+        self.length = len(data)
+
+
+class FakeReader:
+    def __init__(self, buffer):
+        self.data = buffer.data
+        self.offset = 0
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        return cls(buffer)
+
+    def read_bytes(self, out):
+        out[:] = self.data[self.offset:self.offset + len(out)]
+        self.offset += len(out)
+
+    def read_byte(self):
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+
+def payload():
+    return bytes(range(256)) * (SIZE // 256)
+
+
+def read_per_byte(buffer):
+    reader = FakeReader.from_buffer(buffer)
+    return bytes([reader.read_byte() for _ in range(buffer.length)])
+
+
+def throughput(read, buffer, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        read(buffer)
+    return buffer.length * repeat / (time.perf_counter() - start)
+
+
+def test_buffer_protocol_read_is_zero_copy():
+    buffer = FakeBuffer(payload())
+    data = di.read_winrt_buffer(buffer)
+    assert isinstance(data, memoryview)
+    assert data.obj is buffer
+    assert data == payload()
+
+
+def test_reader_fallback_reads_in_bulk(monkeypatch):
+    monkeypatch.setattr(di, 'DataReader', FakeReader, raising=False)
+    data = di.read_winrt_buffer(OpaqueBuffer(payload()))
+    assert isinstance(data, bytearray)
+    assert data == payload()
+
+
+def test_bulk_read_throughput(monkeypatch):
+    monkeypatch.setattr(di, 'DataReader', FakeReader, raising=False)
+    opaque = OpaqueBuffer(payload())
+    per_byte = throughput(read_per_byte, opaque, 3)
+    bulk = throughput(di.read_winrt_buffer, opaque, 50)
+    zero_copy = throughput(di.read_winrt_buffer, FakeBuffer(payload()), 50)
+    print(f"\nthumbnail read {SIZE // 1024} KB: per-byte {per_byte / 1e6:.1f} MB/s, read_bytes {bulk / 1e6:.1f} MB/s, buffer protocol {zero_copy / 1e6:.1f} MB/s")
+    assert bulk > per_byte * 10
+    assert zero_copy > per_byte * 10